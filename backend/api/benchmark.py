@@ -0,0 +1,234 @@
+import math
+import time
+from base64 import b64encode
+from collections import Counter
+from io import BytesIO
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from foodgram.models import Ingredient, Recipe, Tag, User
+from foodgram.synthetic import SYNTHETIC_PASSWORD, synthetic_users
+
+BENCHMARK_USER_PREFIX = 'benchmark'
+
+
+class Endpoint:
+    """
+    Запрос к API в прогоне бенчмарка.
+
+    В path и data подставляются значения из контекста прогона; data
+    может быть функцией от контекста. Если задан save_as, id из ответа
+    сохраняется в контексте для следующих запросов.
+    """
+
+    def __init__(self, name, method, path, data=None, anonymous=False,
+                 save_as=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.anonymous = anonymous
+        self.save_as = save_as
+
+    def get_data(self, context):
+        if callable(self.data):
+            return self.data(context)
+        return self.data
+
+
+def recipe_data(context):
+    return {
+        'name': 'Рецепт для замера',
+        'text': 'Смешать и запечь.',
+        'cooking_time': 30,
+        'tags': context['tags'],
+        'ingredients': [
+            {'id': pk, 'amount': 100} for pk in context['ingredients']
+        ],
+        'image': context['image'],
+    }
+
+
+def user_data(context):
+    context['new_users'] += 1
+    username = f'{BENCHMARK_USER_PREFIX}{context["new_users"]}'
+    return {
+        'email': f'{username}@example.com',
+        'username': username,
+        'first_name': 'Замер',
+        'last_name': 'Нагрузки',
+        'password': SYNTHETIC_PASSWORD,
+    }
+
+
+# Порядок важен: парные запросы (добавить/удалить) возвращают данные
+# в исходное состояние, так что прогоны можно повторять.
+ENDPOINTS = [
+    Endpoint('recipes list (anonymous)', 'get', '/api/recipes/',
+             anonymous=True),
+    Endpoint('recipes list', 'get', '/api/recipes/'),
+    Endpoint('recipes list (tags)', 'get', '/api/recipes/?tags={tag}'),
+    Endpoint('recipes list (favorited)', 'get',
+             '/api/recipes/?is_favorited=1'),
+    Endpoint('recipes list (search)', 'get', '/api/recipes/?name=по'),
+    Endpoint('recipes list (popular)', 'get',
+             '/api/recipes/?ordering=popular'),
+    Endpoint('recipe detail', 'get', '/api/recipes/{recipe}/'),
+    Endpoint('recipe short link', 'get', '/api/recipes/{recipe}/get-link/'),
+    Endpoint('recipe create', 'post', '/api/recipes/', recipe_data,
+             save_as='created'),
+    Endpoint('recipe update', 'patch', '/api/recipes/{created}/',
+             lambda context: {**recipe_data(context), 'cooking_time': 40}),
+    Endpoint('recipe delete', 'delete', '/api/recipes/{created}/'),
+    Endpoint('favorite add', 'post', '/api/recipes/{recipe}/favorite/'),
+    Endpoint('favorite remove', 'delete', '/api/recipes/{recipe}/favorite/'),
+    Endpoint('shopping cart add', 'post',
+             '/api/recipes/{recipe}/shopping_cart/'),
+    Endpoint('shopping cart remove', 'delete',
+             '/api/recipes/{recipe}/shopping_cart/'),
+    Endpoint('shopping cart download', 'get',
+             '/api/recipes/download_shopping_cart/?format=txt'),
+    Endpoint('ingredients list', 'get', '/api/ingredients/'),
+    Endpoint('ingredients search', 'get', '/api/ingredients/?name=ба'),
+    Endpoint('ingredient detail', 'get',
+             '/api/ingredients/{ingredient}/'),
+    Endpoint('tags list', 'get', '/api/tags/'),
+    Endpoint('tag detail', 'get', '/api/tags/{tag_id}/'),
+    Endpoint('users list', 'get', '/api/users/'),
+    Endpoint('user detail', 'get', '/api/users/{author}/'),
+    Endpoint('current user', 'get', '/api/users/me/'),
+    Endpoint('subscriptions', 'get', '/api/users/subscriptions/'),
+    Endpoint('subscribe', 'post', '/api/users/{author}/subscribe/'),
+    Endpoint('unsubscribe', 'delete', '/api/users/{author}/subscribe/'),
+    Endpoint('avatar update', 'put', '/api/users/me/avatar/',
+             lambda context: {'avatar': context['image']}),
+    Endpoint('avatar delete', 'delete', '/api/users/me/avatar/'),
+    Endpoint('user create', 'post', '/api/users/', user_data,
+             anonymous=True),
+    Endpoint('token login', 'post', '/api/auth/token/login/',
+             lambda context: {'email': context['email'],
+                              'password': SYNTHETIC_PASSWORD},
+             anonymous=True),
+    Endpoint('set password', 'post', '/api/users/set_password/',
+             {'current_password': SYNTHETIC_PASSWORD,
+              'new_password': SYNTHETIC_PASSWORD}),
+]
+
+
+def small_image():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), (90, 160, 60)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + b64encode(buffer.getvalue()).decode()
+
+
+def get_context():
+    """
+    Объекты для подстановки в запросы: синтетический автор с
+    рецептами и чужие рецепт и автор, с которыми он ещё не связан.
+    Возвращает None, если синтетических данных нет.
+    """
+    user = (
+        synthetic_users().filter(recipes_count__gt=0).order_by('pk').first()
+    )
+    if user is None:
+        return None
+    recipe = (
+        Recipe.objects.exclude(author=user)
+        .exclude(favorited_by__user=user)
+        .exclude(shopping_cart_by__user=user)
+        .order_by('pk').first()
+    )
+    author = (
+        synthetic_users().exclude(pk=user.pk)
+        .exclude(subscribers__user=user)
+        .order_by('pk').first()
+    )
+    tag = Tag.objects.order_by('pk').first()
+    ingredients = list(
+        Ingredient.objects.order_by('pk').values_list('pk', flat=True)[:5]
+    )
+    if None in (recipe, author, tag) or not ingredients:
+        return None
+    return {
+        'email': user.email,
+        'token': Token.objects.get_or_create(user=user)[0].key,
+        'recipe': recipe.pk,
+        'author': author.pk,
+        'tag': tag.slug,
+        'tag_id': tag.pk,
+        'tags': [tag.pk],
+        'ingredient': ingredients[0],
+        'ingredients': ingredients,
+        'image': small_image(),
+        'created': 0,
+        'new_users': 0,
+    }
+
+
+def percentile(values, percent):
+    """Процентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * percent / 100) - 1)]
+
+
+def summarize(endpoint, times, queries, statuses):
+    return {
+        'method': endpoint.method.upper(),
+        'path': endpoint.path,
+        'statuses': dict(statuses),
+        'latency_ms': {
+            'p50': percentile(times, 50),
+            'p95': percentile(times, 95),
+            'p99': percentile(times, 99),
+            'max': max(times),
+        },
+        'queries': {
+            'p50': percentile(queries, 50),
+            'max': max(queries),
+        },
+    }
+
+
+def cleanup():
+    """Удаляет пользователей, созданных запросами бенчмарка."""
+    User.objects.filter(username__startswith=BENCHMARK_USER_PREFIX).delete()
+
+
+def run(endpoints, context, iterations, warmup=1):
+    """
+    Прогоняет запросы iterations раз после warmup прогонов и
+    возвращает время (в мс), число SQL-запросов и коды ответов.
+    """
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {context["token"]}')
+    anonymous = APIClient()
+    stats = {
+        endpoint.name: {'times': [], 'queries': [], 'statuses': Counter()}
+        for endpoint in endpoints
+    }
+    for iteration in range(warmup + iterations):
+        for endpoint in endpoints:
+            request = getattr(
+                anonymous if endpoint.anonymous else client, endpoint.method
+            )
+            path = endpoint.path.format(**context)
+            data = endpoint.get_data(context)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = request(path, data, format='json')
+                elapsed = time.perf_counter() - started
+            if endpoint.save_as and response.status_code < 300:
+                context[endpoint.save_as] = response.json()['id']
+            if iteration < warmup:
+                continue
+            stats[endpoint.name]['times'].append(elapsed * 1000)
+            stats[endpoint.name]['queries'].append(len(queries))
+            stats[endpoint.name]['statuses'][response.status_code] += 1
+    return {
+        endpoint.name: summarize(endpoint, **stats[endpoint.name])
+        for endpoint in endpoints
+    }
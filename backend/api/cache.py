@@ -0,0 +1,62 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+CATALOG = 'catalog'
+COUNTS = 'counts'
+VERSION_KEY = 'version:{}'
+
+
+def get_version(name):
+    """Текущая версия набора данных; меняется при каждом изменении."""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """
+    Меняет версию набора после коммита текущей транзакции.
+
+    Если сменить её раньше, параллельный запрос прочитает новую версию
+    вместе со старыми строками и закэширует их как свежие.
+    """
+    key = VERSION_KEY.format(name)
+    transaction.on_commit(
+        lambda: cache.set(key, uuid4().hex, timeout=None)
+    )
+
+
+def get_many_versioned(keys, names):
+    """Записи кэша по ключам и текущие версии наборов одним запросом."""
+    version_keys = {VERSION_KEY.format(name): name for name in names}
+    found = cache.get_many([*keys, *version_keys])
+    versions = {
+        name: found[key] for key, name in version_keys.items() if key in found
+    }
+    for name in set(version_keys.values()) - set(versions):
+        versions[name] = get_version(name)
+    return {key: found[key] for key in keys if key in found}, versions
+
+
+def get_versions(names):
+    """Текущие версии нескольких наборов одним запросом к кэшу."""
+    return get_many_versioned([], names)[1]
+
+
+def model_tag(model):
+    """Набор «все объекты модели»: меняется при изменении любого из них."""
+    return model._meta.label_lower
+
+
+def instance_tag(model, pk):
+    return f'{model_tag(model)}:{pk}'
+
+
+def bump_instance(model, pk):
+    bump_version(model_tag(model))
+    bump_version(instance_tag(model, pk))
@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from foodgram.models import FavoriteRecipe, Recipe, ShoppingCart, Subscription
+
+User = get_user_model()
+
+# Счётчик -> (модель связи, поле связи), по которым он пересчитывается.
+COUNTERS = {
+    Recipe: {
+        'favorites_count': (FavoriteRecipe, 'recipe'),
+        'carts_count': (ShoppingCart, 'recipe'),
+    },
+    User: {
+        'recipes_count': (Recipe, 'author'),
+        'subscribers_count': (Subscription, 'subscribed_to'),
+    },
+}
+
+
+def change_counter(model, pk, field, delta):
+    """Меняет счётчик одним UPDATE field = field + delta, не ниже нуля."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def update_counters(source, instance, delta):
+    """Меняет счётчики, которые считают строки модели source."""
+    for model, counters in COUNTERS.items():
+        for field, (counted, relation) in counters.items():
+            if counted is source:
+                change_counter(
+                    model, getattr(instance, f'{relation}_id'), field, delta
+                )
+
+
+def count_related(model, field):
+    """Подзапрос с настоящим числом связанных строк для OuterRef('pk')."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def reconcile_counters(model, batch_size):
+    """
+    Сверяет счётчики модели с таблицами связей порциями по id
+    и исправляет расхождения. Возвращает число исправленных объектов.
+    """
+    counters = COUNTERS[model]
+    objects = model.objects.order_by('pk').only('pk', *counters).annotate(
+        **{f'actual_{field}': count_related(*source)
+           for field, source in counters.items()}
+    )
+    last_pk = 0
+    fixed = 0
+    while True:
+        batch = list(objects.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        changed = []
+        for obj in batch:
+            actual = {
+                field: getattr(obj, f'actual_{field}') for field in counters
+            }
+            if any(getattr(obj, field) != value
+                   for field, value in actual.items()):
+                for field, value in actual.items():
+                    setattr(obj, field, value)
+                changed.append(obj)
+        if changed:
+            model.objects.bulk_update(changed, list(counters))
+            fixed += len(changed)
+        last_pk = batch[-1].pk
+    return fixed
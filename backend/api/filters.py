@@ -1,14 +1,16 @@
 import django_filters
+from django.db.models import Exists, F, OuterRef
 from django_filters.rest_framework import BooleanFilter
+from rest_framework.filters import BaseFilterBackend
 
-from foodgram.models import Recipe, Tag, User
+from foodgram.models import FavoriteRecipe, Recipe, ShoppingCart, Tag, User
 
 
 class RecipeFilterSet(django_filters.FilterSet):
     tags = django_filters.ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(),
-        field_name='tags__slug',
         to_field_name='slug',
+        method='filter_tags',
         label='Теги'
     )
     author = django_filters.ModelChoiceFilter(
@@ -25,14 +27,57 @@ class RecipeFilterSet(django_filters.FilterSet):
         model = Recipe
         fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart']
 
+    # Фильтры по связанным таблицам сделаны через EXISTS, а не JOIN:
+    # строки рецептов не размножаются и distinct() не нужен.
+
+    def filter_tags(self, queryset, name, value):
+        # Без параметра сюда приходит пустой QuerySet тегов, а не None.
+        if not value:
+            return queryset
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__in=value
+            )
+        ))
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if user.is_authenticated and value:
-            return queryset.filter(favorited_by__user=user).distinct()
+            return queryset.filter(Exists(
+                FavoriteRecipe.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if user and user.is_authenticated and value:
-            return queryset.filter(shopping_cart_by__user=user).distinct()
+            return queryset.filter(Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
         return queryset
+
+
+class RecipeOrderingFilter(BaseFilterBackend):
+    """
+    Сортировка ленты по ?ordering=popular (всё время)
+    или ?ordering=trending (с затуханием по времени).
+
+    Обе идут по индексам recipe_popular_idx и recipe_trending_idx.
+    """
+    ordering_param = 'ordering'
+    orderings = {
+        'popular': ('-popularity', '-id'),
+        'trending': ('-trending_score', '-id'),
+    }
+
+    @classmethod
+    def get_ordering(cls, request):
+        return cls.orderings.get(request.query_params.get(cls.ordering_param))
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request)
+        if ordering is None:
+            return queryset
+        return queryset.annotate(
+            popularity=F('favorites_count') + F('carts_count')
+        ).order_by(*ordering)
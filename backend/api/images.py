@@ -0,0 +1,95 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from foodgram.constants import IMAGE_VARIANT_SIZES
+
+from .cache import bump_instance
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_PIPELINE_WORKERS,
+    thread_name_prefix='image-variants',
+)
+
+# Ключ, под которым хранится имя исходного файла: по нему видно,
+# для какой версии изображения уже построены уменьшенные копии.
+SOURCE = 'source'
+
+
+def save_image(image, storage, name, image_format):
+    buffer = BytesIO()
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    image.save(buffer, image_format, quality=85, optimize=True)
+    return storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_variants(field_file):
+    """Сохраняет уменьшенные копии изображения в JPEG и WebP."""
+    storage = field_file.storage
+    path = PurePosixPath(field_file.name)
+    with storage.open(field_file.name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    variants = {SOURCE: field_file.name}
+    for variant, size in IMAGE_VARIANT_SIZES.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail(size, Image.LANCZOS)
+        name = str(path.parent / 'variants' / f'{path.stem}_{variant}')
+        variants[variant] = save_image(
+            thumbnail, storage, f'{name}.jpg', 'JPEG'
+        )
+        variants[f'{variant}_webp'] = save_image(
+            thumbnail, storage, f'{name}.webp', 'WEBP'
+        )
+    return variants
+
+
+def process_image(model, pk, field_name, variants_field, name):
+    try:
+        instance = model.objects.filter(pk=pk).only(field_name).first()
+        field_file = instance and getattr(instance, field_name)
+        if not field_file or field_file.name != name:
+            return
+        if model.objects.filter(pk=pk, **{field_name: name}).update(
+                **{variants_field: build_variants(field_file)}):
+            bump_instance(model, pk)
+    except Exception:
+        logger.exception('Failed to build variants for %s', name)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(instance, field_name, variants_field):
+    """
+    Ставит построение уменьшенных копий в очередь после коммита.
+
+    Ответ на запрос не ждёт обработки: пока копий нет, отдаётся оригинал.
+    """
+    field_file = getattr(instance, field_name)
+    variants = getattr(instance, variants_field)
+    if not field_file:
+        if variants:
+            type(instance).objects.filter(pk=instance.pk).update(
+                **{variants_field: {}}
+            )
+        return
+    if variants.get(SOURCE) == field_file.name:
+        return
+    task = (type(instance), instance.pk, field_name, variants_field,
+            field_file.name)
+    if settings.IMAGE_PIPELINE_ASYNC:
+        transaction.on_commit(lambda: _executor.submit(process_image, *task))
+    else:
+        transaction.on_commit(lambda: process_image(*task))
@@ -0,0 +1,112 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Count
+
+from foodgram.models import Ingredient, RecipeIngredient
+
+from .cache import CATALOG, get_version
+
+WORD_START = re.compile(r'(?<![^\W_])\w')
+FULL_MATCH, WORD_MATCH = 0, 1
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Отсортированный в памяти индекс названий ингредиентов.
+
+    Каждое название попадает в индекс целиком и начиная с каждого
+    следующего слова, поиск по префиксу делается двоичным поиском.
+    Индекс строится при первом запросе и перестраивается при смене
+    версии каталога или по истечении INGREDIENT_INDEX_TTL, чтобы
+    обновлялась частота использования ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = None
+        self._keys = []
+        self._entries = []
+        self._ingredients = []
+
+    def _build(self):
+        usage = dict(
+            RecipeIngredient.objects.order_by()
+            .values_list('ingredient')
+            .annotate(Count('id'))
+        )
+        ingredients = []
+        keys = []
+        for position, (pk, name, unit) in enumerate(
+                Ingredient.objects.values_list('id', 'name', 'unit')):
+            ingredients.append((
+                usage.get(pk, 0), name,
+                {'id': pk, 'name': name, 'measurement_unit': unit},
+            ))
+            normalized = normalize(name)
+            for match in WORD_START.finditer(normalized):
+                start = match.start()
+                keys.append((
+                    normalized[start:],
+                    FULL_MATCH if start == 0 else WORD_MATCH,
+                    position,
+                ))
+        keys.sort()
+        self._keys = [key for key, _, _ in keys]
+        self._entries = [(rank, position) for _, rank, position in keys]
+        self._ingredients = ingredients
+
+    def _ensure_fresh(self):
+        version = get_version(CATALOG)
+        now = time.monotonic()
+        if (
+            version == self._version
+            and now - self._built_at < settings.INGREDIENT_INDEX_TTL
+        ):
+            return
+        with self._lock:
+            if version != self._version or (
+                    now - self._built_at >= settings.INGREDIENT_INDEX_TTL):
+                self._build()
+                self._version = version
+                self._built_at = now
+
+    def search(self, query):
+        """
+        Ингредиенты, название или одно из слов которых начинается с query.
+
+        Сначала идут совпадения с начала названия, затем по частоте
+        использования в рецептах.
+        """
+        query = normalize(query.strip())
+        if not query:
+            return []
+        self._ensure_fresh()
+        keys, entries = self._keys, self._entries
+        ingredients = self._ingredients
+        ranks = {}
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\uffff', start)
+        for rank, position in entries[start:end]:
+            if ranks.get(position, WORD_MATCH) >= rank:
+                ranks[position] = rank
+        order = sorted(
+            ranks,
+            key=lambda position: (
+                ranks[position],
+                -ingredients[position][0],
+                ingredients[position][1],
+            )
+        )
+        return [ingredients[position][2] for position in order]
+
+
+ingredient_index = IngredientIndex()
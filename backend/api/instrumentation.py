@@ -0,0 +1,230 @@
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetrics:
+    """
+    Замеры одного запроса.
+
+    Экземпляр служит обёрткой выполнения SQL (connection.execute_wrapper):
+    считает запросы, их суммарное время и хранит самые долгие.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.top_queries = []
+        self.view_started = None
+        self.view_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.sql_count += 1
+            self.sql_time += duration
+            query = (duration, self.sql_count, sql)
+            if len(self.top_queries) < settings.SLOW_REQUEST_TOP_QUERIES:
+                heapq.heappush(self.top_queries, query)
+            else:
+                heapq.heappushpop(self.top_queries, query)
+
+    def start_view(self):
+        self.view_started = time.perf_counter()
+
+    def start_render(self):
+        self.render_started = time.perf_counter()
+        self.view_time = self.render_started - self.view_started
+
+    def finish_render(self):
+        self.render_time = time.perf_counter() - self.render_started
+
+    def finish(self):
+        """Завершает замер; возвращает полное время запроса."""
+        finished = time.perf_counter()
+        if self.view_started is not None and self.render_started is None:
+            # Ответ без отложенного рендера: всё время после вызова
+            # представления — время представления.
+            self.view_time = finished - self.view_started
+        return finished - self.started
+
+    def server_timing(self, total):
+        return ', '.join((
+            f'db;desc="{self.sql_count} queries";'
+            f'dur={self.sql_time * 1000:.1f}',
+            f'view;dur={self.view_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+
+def label(value):
+    return (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def labels(**values):
+    return ','.join(
+        f'{name}="{label(value)}"' for name, value in values.items()
+    )
+
+
+class MetricsRegistry:
+    """
+    Счётчики и гистограммы времени запросов по маршрутам.
+
+    Хранятся в памяти процесса: при нескольких воркерах gunicorn
+    у каждого свои значения.
+    """
+    totals = (
+        ('http_request_db_queries_total', 'SQL queries.', 'sql_count'),
+        ('http_request_db_seconds_total', 'SQL time.', 'sql_time'),
+        ('http_request_view_seconds_total', 'View time.', 'view_time'),
+        ('http_request_render_seconds_total', 'Render time.',
+         'render_time'),
+    )
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.histograms = {}
+        self.sums = defaultdict(float)
+
+    def observe(self, route, method, status, metrics, total):
+        key = (route, method)
+        with self.lock:
+            self.requests[(route, method, status)] += 1
+            if key not in self.histograms:
+                self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts, _ = histogram = self.histograms[key]
+            counts[bisect_left(self.buckets, total)] += 1
+            histogram[1] += total
+            for name, _, attribute in self.totals:
+                self.sums[(name, route, method)] += getattr(
+                    metrics, attribute
+                )
+
+    def render(self):
+        """Значения в текстовом формате Prometheus."""
+        with self.lock:
+            lines = [
+                '# HELP http_requests_total Requests by route and status.',
+                '# TYPE http_requests_total counter',
+            ]
+            for (route, method, status), count in self.requests.items():
+                lines.append(
+                    f'http_requests_total'
+                    f'{{{labels(route=route, method=method, status=status)}}}'
+                    f' {count}'
+                )
+            name = 'http_request_duration_seconds'
+            lines += [
+                f'# HELP {name} Request latency.',
+                f'# TYPE {name} histogram',
+            ]
+            for (route, method), (counts, total) in self.histograms.items():
+                common = labels(route=route, method=method)
+                cumulative = 0
+                bounds = [*map(str, self.buckets), '+Inf']
+                for bound, count in zip(bounds, counts):
+                    cumulative += count
+                    lines.append(
+                        f'{name}_bucket{{{common},le="{bound}"}} {cumulative}'
+                    )
+                lines.append(f'{name}_sum{{{common}}} {total}')
+                lines.append(f'{name}_count{{{common}}} {cumulative}')
+            for name, description, _ in self.totals:
+                lines += [
+                    f'# HELP {name} {description}',
+                    f'# TYPE {name} counter',
+                ]
+                lines.extend(
+                    f'{name}{{{labels(route=route, method=method)}}} {value}'
+                    for (metric, route, method), value in self.sums.items()
+                    if metric == name
+                )
+            return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry(settings.METRICS_LATENCY_BUCKETS)
+
+
+def metrics_view(request):
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+class InstrumentationMiddleware:
+    """
+    Замеряет время SQL, представления и рендера каждого запроса.
+
+    Отдаёт замеры в заголовке Server-Timing, копит их в registry
+    по маршрутам и пишет в лог запросы дольше SLOW_REQUEST_THRESHOLD
+    миллисекунд вместе с самыми долгими SQL-запросами. Должен стоять
+    первым в MIDDLEWARE, чтобы учитывать время остальных.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = request.metrics = RequestMetrics()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        total = metrics.finish()
+        response['Server-Timing'] = metrics.server_timing(total)
+        match = request.resolver_match
+        registry.observe(
+            match.view_name if match else 'unmatched',
+            request.method, response.status_code, metrics, total
+        )
+        if total * 1000 >= settings.SLOW_REQUEST_THRESHOLD:
+            self.log_slow_request(request, response, metrics, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics.start_view()
+
+    def process_template_response(self, request, response):
+        # DRF Response рендерится после всех process_template_response.
+        request.metrics.start_render()
+        response.add_post_render_callback(
+            lambda response: request.metrics.finish_render()
+        )
+        return response
+
+    def log_slow_request(self, request, response, metrics, total):
+        queries = '\n'.join(
+            f'  {duration * 1000:.1f} ms: {sql}'
+            for duration, _, sql in sorted(metrics.top_queries, reverse=True)
+        )
+        logger.warning(
+            'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, '
+            'view %.0f ms, render %.0f ms\n%s',
+            request.method, request.get_full_path(), response.status_code,
+            total * 1000, metrics.sql_count, metrics.sql_time * 1000,
+            metrics.view_time * 1000, metrics.render_time * 1000, queries
+        )
@@ -0,0 +1,198 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.parsers import FormParser, MultiPartParser
+
+from .cache import CATALOG, get_version, get_versions
+from .pagination import KeysetPagination
+from .parsers import ORJSONParser
+from .renderers import dumps
+from .uploads import ImageUploadHandler, RawImageParser, normalize_form_data
+
+
+class CatalogCacheMixin:
+    """
+    Отдаёт справочники из кэша готовых JSON-ответов.
+
+    Ключ кэша включает версию каталога, поэтому после изменения тегов
+    или ингредиентов ответы пересобираются. ETag считается по телу
+    ответа, на совпадающий If-None-Match возвращается 304.
+    """
+
+    def get_catalog_cache_key(self, request):
+        query = sorted(request.query_params.lists())
+        digest = hashlib.sha256(
+            f'{request.path}?{query}'.encode('utf-8')
+        ).hexdigest()
+        return f'catalog:{get_version(CATALOG)}:{digest}'
+
+    def cached_catalog_response(self, handler, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return handler(request, *args, **kwargs)
+        key = self.get_catalog_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = dumps(response.data)
+            etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+            cached = (etag, content)
+            cache.set(key, cached, settings.CATALOG_CACHE_TIMEOUT)
+        etag, content = cached
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and {etag, '*'} & set(parse_etags(if_none_match)):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_catalog_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_catalog_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class AnonymousCacheMixin:
+    """
+    Кэширует JSON-ответы list и retrieve для анонимных пользователей.
+
+    Запись хранит версии наборов данных, из которых собран ответ
+    (get_cache_tags и get_response_cache_tags), и отдаётся, пока ни
+    одна из них не изменилась. Пересобирает запись один процесс:
+    остальные отдают прежний ответ или недолго ждут нового.
+    """
+
+    def get_cache_tags(self):
+        return []
+
+    def get_response_cache_tags(self, data):
+        return []
+
+    def get_anonymous_cache_key(self, request):
+        # Схема и хост входят в ключ: в ответе абсолютные ссылки.
+        base_url = request.build_absolute_uri('/')
+        query = sorted(request.query_params.lists())
+        digest = hashlib.sha256(
+            f'{base_url}:{request.path}?{query}'.encode('utf-8')
+        ).hexdigest()
+        return f'anonymous:{digest}'
+
+    def get_fresh_entry(self, key):
+        entry = cache.get(key)
+        if entry is not None and get_versions(entry[0]) == entry[0]:
+            return entry
+        return None
+
+    def wait_for_entry(self, key):
+        deadline = time.monotonic() + settings.ANONYMOUS_CACHE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = self.get_fresh_entry(key)
+            if entry is not None:
+                return entry
+        return None
+
+    def cached_anonymous_response(self, handler, request, *args, **kwargs):
+        if (request.user.is_authenticated
+                or request.accepted_renderer.format != 'json'):
+            return handler(request, *args, **kwargs)
+        key = self.get_anonymous_cache_key(request)
+        entry = cache.get(key)
+        if entry is None or get_versions(entry[0]) != entry[0]:
+            lock_key = f'{key}:lock'
+            if cache.add(lock_key, 1, settings.ANONYMOUS_CACHE_LOCK_TIMEOUT):
+                try:
+                    return self.build_anonymous_response(
+                        key, handler, request, *args, **kwargs
+                    )
+                finally:
+                    cache.delete(lock_key)
+            # Запись пересобирает другой процесс.
+            entry = entry or self.wait_for_entry(key)
+            if entry is None:
+                return handler(request, *args, **kwargs)
+        return HttpResponse(entry[1], content_type='application/json')
+
+    def build_anonymous_response(self, key, handler, request, *args,
+                                 **kwargs):
+        # Версии читаются до сборки ответа, а меняются только после
+        # коммита: запись, собранная из старых строк, получит старую
+        # версию и устареет, как только изменение станет видно.
+        versions = get_versions(self.get_cache_tags())
+        response = handler(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        versions.update(
+            get_versions(self.get_response_cache_tags(response.data))
+        )
+        content = dumps(response.data)
+        cache.set(key, (versions, content),
+                  settings.ANONYMOUS_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_anonymous_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_anonymous_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class KeysetPaginationMixin:
+    """
+    Переключает список на курсорную пагинацию по ?cursor=
+    или ?pagination=cursor, иначе используется pagination_class.
+    """
+    keyset_ordering = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if (self.keyset_ordering
+                    and KeysetPagination.is_requested(self.request)):
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
+
+class ImageUploadMixin:
+    """
+    Принимает изображение строкой base64 в JSON, файлом multipart-формы
+    или телом запроса с Content-Type: image/*.
+
+    Файлы форм и тела запросов пишутся во временные файлы по кускам
+    и проверяются по заголовку до окончания загрузки.
+    """
+    parser_classes = [
+        ORJSONParser, FormParser, MultiPartParser, RawImageParser
+    ]
+    upload_field = 'image'
+    form_list_fields = ()
+    form_json_fields = ()
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers.insert(0, ImageUploadHandler(request))
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        if 'data' in kwargs:
+            kwargs['data'] = normalize_form_data(
+                kwargs['data'], self.form_list_fields, self.form_json_fields
+            )
+        return super().get_serializer(*args, **kwargs)
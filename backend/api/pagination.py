@@ -1,8 +1,253 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 from foodgram.constants import PAGINATION_LIMIT
 
+from .cache import COUNTS, get_version
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк таблицы из статистики PostgreSQL.
+
+    Возвращает None на других СУБД и для небольших таблиц,
+    где точный COUNT(*) дешёвый, а статистика может быть неточной.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < settings.PAGINATION_COUNT_ESTIMATE_MIN:
+        return None
+    return row[0]
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт число объектов из кэша или оценки."""
+
+    def __init__(self, object_list, per_page, count_key, estimate=False):
+        super().__init__(object_list, per_page)
+        self.count_key = count_key
+        self.estimate = estimate
+        self.count_is_exact = True
+
+    @cached_property
+    def count(self):
+        if self.estimate:
+            count = estimate_count(self.object_list)
+            if count is not None:
+                self.count_is_exact = False
+                return count
+        count = cache.get(self.count_key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(self.count_key, count,
+                      settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
 
 class LimitPagination(PageNumberPagination):
+    """
+    Постраничный вывод с кэшированным числом объектов.
+
+    Число объектов кэшируется по пути, параметрам фильтрации и
+    пользователю и сбрасывается при изменении рецептов, избранного,
+    корзин и подписок. Для представлений с count_estimate = True
+    на PostgreSQL без фильтров берётся оценка из pg_class.
+    """
+    page_size_query_param = 'limit'
+    max_page_size = PAGINATION_LIMIT
+
+    def get_filter_params(self, request):
+        return sorted(
+            (key, values) for key, values in request.query_params.lists()
+            if key not in (self.page_query_param, self.page_size_query_param)
+        )
+
+    def get_count_key(self, request, filter_params):
+        digest = hashlib.sha256(
+            f'{request.path}?{filter_params}:{request.user.pk}'.encode()
+        ).hexdigest()
+        return f'count:{get_version(COUNTS)}:{digest}'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        filter_params = self.get_filter_params(request)
+        self.count_key = self.get_count_key(request, filter_params)
+        self.count_estimate = (
+            not filter_params and getattr(view, 'count_estimate', False)
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, object_list, per_page):
+        # PageNumberPagination создаёт Paginator через этот атрибут.
+        return CachedCountPaginator(object_list, per_page,
+                                    count_key=self.count_key,
+                                    estimate=self.count_estimate)
+
+    def get_paginated_response(self, data):
+        paginator = self.page.paginator
+        return Response({
+            'count': paginator.count,
+            'count_is_exact': paginator.count_is_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_exact'] = {
+            'type': 'boolean',
+            'example': True,
+        }
+        return response_schema
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу сортировки вместо OFFSET и COUNT(*).
+
+    Курсор хранит значения полей сортировки последней (или первой)
+    записи страницы, следующая страница выбирается условием
+    WHERE (date_created, id) < (...), которое идёт по индексу.
+    Порядок задаётся атрибутом keyset_ordering представления, в нём
+    можно использовать поля модели и аннотации queryset.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
     page_size_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
     max_page_size = PAGINATION_LIMIT
+    invalid_cursor_message = 'Invalid cursor'
+
+    @classmethod
+    def is_requested(cls, request):
+        return (
+            cls.cursor_query_param in request.query_params
+            or request.query_params.get(cls.mode_query_param) == 'cursor'
+        )
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    @staticmethod
+    def encode_value(value):
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        raise TypeError(f'Cannot encode {type(value).__name__} in cursor.')
+
+    def encode_cursor(self, obj, reverse):
+        values = [getattr(obj, field.lstrip('-')) for field in self.ordering]
+        # isoformat вместо DjangoJSONEncoder: тот отбрасывает микросекунды.
+        payload = json.dumps([values, reverse], default=self.encode_value)
+        cursor = urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def get_field(self, queryset, name):
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)
+
+    def decode_cursor(self, request, queryset):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            values, reverse = json.loads(urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError(self.invalid_cursor_message)
+            values = [
+                self.get_field(queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, LookupError,
+                ValidationError) as error:
+            raise NotFound(self.invalid_cursor_message) from error
+        return values, bool(reverse)
+
+    def get_keyset_filter(self, values, reverse):
+        conditions = []
+        for position, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = f'{name}__lt' if descending else f'{name}__gt'
+            equal = {
+                ordered.lstrip('-'): value
+                for ordered, value in zip(self.ordering[:position], values)
+            }
+            conditions.append(Q(**equal, **{lookup: values[position]}))
+        return reduce(or_, conditions)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = view.keyset_ordering
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.mode_query_param
+        )
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset)
+        reverse = False
+        order_by = self.ordering
+        if cursor is not None:
+            values, reverse = cursor
+            queryset = queryset.filter(self.get_keyset_filter(values, reverse))
+        if reverse:
+            order_by = [
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in self.ordering
+            ]
+        results = list(queryset.order_by(*order_by)[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+        self.has_next = has_more or reverse
+        self.has_previous = has_more if reverse else cursor is not None
+        self.page = results
+        return results
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
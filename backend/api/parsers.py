@@ -0,0 +1,16 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .renderers import orjson
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser на orjson; без orjson работает как обычный JSONParser."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
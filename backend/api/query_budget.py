@@ -0,0 +1,75 @@
+import re
+import time
+from collections import Counter
+
+from django.db import DatabaseError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+# Строки и числа в SQL заменяются на ?, чтобы одинаковые по форме
+# запросы (признак N+1) считались вместе.
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+EXPLAINABLE = ('SELECT', 'WITH')
+
+
+def sql_shape(sql):
+    return LITERAL.sub('?', sql)
+
+
+def explain(sql):
+    """План запроса или текст ошибки, если его не удалось получить."""
+    prefix = (
+        'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    )
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}')
+            return [
+                ' '.join(str(value) for value in row)
+                for row in cursor.fetchall()
+            ]
+    except DatabaseError as error:
+        return [f'EXPLAIN failed: {error}']
+
+
+def budget_report(name, queries, budget, elapsed=None, time_budget=None):
+    """
+    Отчёт о превышении бюджета: запросы, сгруппированные по форме
+    (самые частые первыми), и план первого запроса каждой формы.
+    """
+    lines = [f'{name}: {len(queries)} queries (budget {budget})']
+    if elapsed is not None:
+        lines[0] += f', {elapsed:.0f} ms (budget {time_budget} ms)'
+    shapes = Counter(sql_shape(query['sql']) for query in queries)
+    examples = {}
+    for query in queries:
+        examples.setdefault(sql_shape(query['sql']), query['sql'])
+    for shape, count in shapes.most_common():
+        sql = examples[shape]
+        lines.append(f'{count}x {sql}')
+        if sql.lstrip().upper().startswith(EXPLAINABLE):
+            lines.extend(f'    {row}' for row in explain(sql))
+    return '\n'.join(lines)
+
+
+class QueryBudgetMixin:
+    """
+    Проверки бюджета SQL-запросов и времени для TestCase.
+
+    При превышении тест падает с отчётом budget_report.
+    """
+
+    def assertWithinBudget(self, name, budget, request, *args,
+                           time_budget=None, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = request(*args, **kwargs)
+            elapsed = (time.perf_counter() - started) * 1000
+        queries = context.captured_queries
+        if len(queries) > budget or (
+            time_budget is not None and elapsed > time_budget
+        ):
+            self.fail(budget_report(
+                name, queries, budget,
+                elapsed if time_budget is not None else None, time_budget
+            ))
+        return response
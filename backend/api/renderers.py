@@ -0,0 +1,82 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Чем кодировать то, что orjson не знает сам: Decimal, ленивые строки
+# перевода, а также datetime/date/time, чтобы формат совпадал с DRF.
+encode_default = JSONEncoder().default
+
+
+def dumps(data):
+    """
+    Сериализует данные в JSON-байты в формате JSONRenderer.
+
+    Совпадение не полное: float с порядком orjson пишет как 1e16, а не
+    1e+16, NaN и бесконечности становятся null, тогда как JSONRenderer
+    со STRICT_JSON на них падает.
+    """
+    if orjson is None:
+        return JSONRenderer().render(data)
+    content = orjson.dumps(
+        data,
+        default=encode_default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+    )
+    # Как и JSONRenderer, экранируем разделители строк, недопустимые в JS.
+    return content.replace(
+        '\u2028'.encode(), b'\\u2028'
+    ).replace('\u2029'.encode(), b'\\u2029')
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson.
+
+    Без установленного orjson и при запросе отступов (indent в Accept)
+    работает как обычный JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(
+            accepted_media_type, renderer_context or {}
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        return dumps(data)
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Позволяет выбрать формат списка покупок через ?format=.
+
+    Сам файл отдаётся готовым ответом, рендерер используется только
+    для согласования формата и текста ошибок.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        if isinstance(data, str):
+            data = data.encode(self.charset)
+        return data
+
+
+class TxtRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
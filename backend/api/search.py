@@ -0,0 +1,175 @@
+import operator
+import re
+from collections import defaultdict
+from functools import reduce
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import F, Func, OuterRef, Q, Subquery, Value
+from rest_framework.filters import SearchFilter
+
+from foodgram.models import Recipe, RecipeIngredient
+
+from .ingredient_index import normalize
+
+SEARCH_CONFIG = 'russian'
+GIN_INDEX = 'foodgram_recipe_search_gin'
+FTS_TABLE = 'foodgram_recipe_fts'
+# Веса bm25 для столбцов name, text и ingredients таблицы FTS5.
+FTS_WEIGHTS = '10.0, 4.0, 1.0'
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def create_search_index(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Создаёт поисковый индекс после migrate.
+
+    PostgreSQL: GIN-индекс по Recipe.search_vector.
+    SQLite: виртуальная таблица FTS5 с rowid = id рецепта.
+    """
+    db = connections[using]
+    table = Recipe._meta.db_table
+    with db.cursor() as cursor:
+        if db.vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {GIN_INDEX} '
+                f'ON {table} USING gin (search_vector)'
+            )
+        elif db.vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                f'USING fts5(name, text, ingredients, '
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+
+
+def fold_yo(expression):
+    """Заменяет ё на е: ни словари PostgreSQL, ни FTS5 их не склеивают."""
+    return Func(expression, Value('ёЁ'), Value('еЕ'), function='translate')
+
+
+def index_recipes(pks):
+    """Пересчитывает поисковые данные рецептов с указанными id."""
+    pks = list(pks)
+    if not pks:
+        return
+    if connection.vendor == 'postgresql':
+        names = (
+            RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+            .values('recipe')
+            .annotate(names=StringAgg('ingredient__name', ' '))
+            .values('names')
+        )
+        columns = (
+            (F('name'), 'A'), (F('text'), 'B'), (Subquery(names), 'C'),
+        )
+        vectors = [
+            SearchVector(fold_yo(column), weight=weight, config=SEARCH_CONFIG)
+            for column, weight in columns
+        ]
+        Recipe.objects.filter(pk__in=pks).update(
+            search_vector=vectors[0] + vectors[1] + vectors[2]
+        )
+    elif connection.vendor == 'sqlite':
+        ingredients = defaultdict(list)
+        for recipe_id, name in RecipeIngredient.objects.filter(
+                recipe__in=pks).values_list('recipe_id', 'ingredient__name'):
+            ingredients[recipe_id].append(name)
+        rows = [
+            (pk, normalize(name), normalize(text),
+             normalize(' '.join(ingredients[pk])))
+            for pk, name, text in Recipe.objects.filter(
+                pk__in=pks).values_list('pk', 'name', 'text')
+        ]
+        remove_recipes(pks)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+                'VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+
+
+def remove_recipes(pks):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+            [(pk,) for pk in pks],
+        )
+
+
+class PrefixQuery(SearchQuery):
+    """
+    tsquery «слово по началу слова».
+
+    Слово, которое словарь russian отбрасывает как стоп-слово (по, на),
+    ищется как есть через simple: иначе запрос оказался бы пустым и
+    ничего не нашёл бы, тогда как SQLite ищет по любому началу слова.
+    """
+
+    def __init__(self, word):
+        self.prefix = f'{word}:*'
+        super().__init__(self.prefix, config=SEARCH_CONFIG, search_type='raw')
+
+    def as_sql(self, compiler, connection, function=None, template=None):
+        sql, params = super().as_sql(compiler, connection, function, template)
+        return (
+            f"CASE WHEN numnode({sql}) = 0 "
+            f"THEN to_tsquery('simple', %s) ELSE {sql} END",
+            [*params, self.prefix, *params],
+        )
+
+
+def search_recipes(queryset, words):
+    """
+    Оставляет рецепты, содержащие все слова (по началу слова),
+    и сортирует их по релевантности.
+    """
+    if connection.vendor == 'postgresql':
+        query = reduce(operator.and_, map(PrefixQuery, words))
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        )
+    elif connection.vendor == 'sqlite':
+        # Таблица FTS присоединяется один раз: MATCH выполняется одним
+        # проходом по индексу, bm25 считается для найденных строк.
+        table = Recipe._meta.db_table
+        queryset = queryset.extra(
+            select={
+                'search_rank': f'-bm25({FTS_TABLE}, {FTS_WEIGHTS})',
+            },
+            tables=[FTS_TABLE],
+            where=[
+                f'{FTS_TABLE}.rowid = {table}.id',
+                f'{FTS_TABLE} MATCH %s',
+            ],
+            params=[' '.join(f'"{word}"*' for word in words)],
+        )
+    else:
+        for word in words:
+            queryset = queryset.filter(
+                Q(name__icontains=word) | Q(text__icontains=word)
+            )
+        return queryset
+    return queryset.order_by('-search_rank', *Recipe._meta.ordering)
+
+
+class RecipeSearchFilter(SearchFilter):
+    """
+    Полнотекстовый поиск рецептов по названию, описанию
+    и ингредиентам (параметр SEARCH_PARAM, по умолчанию ?name=).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        words = [
+            normalize(word)
+            for term in self.get_search_terms(request)
+            for word in WORD_PATTERN.findall(term)
+        ]
+        if not words:
+            return queryset
+        return search_recipes(queryset, words)
@@ -1,20 +1,77 @@
-import uuid
-from base64 import b64decode
-
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (Exists, OuterRef, Prefetch,
+                              prefetch_related_objects)
 from rest_framework import serializers
 from rest_framework.serializers import ValidationError
 
 from foodgram.models import (FavoriteRecipe, Ingredient, Recipe,
                              RecipeIngredient, ShoppingCart, Subscription, Tag)
 
+from .cache import CATALOG, get_many_versioned, instance_tag
+from .search import index_recipes
+from .uploads import ImageUploadError, decode_base64_image
+
 User = get_user_model()
 
+SMALL_IMAGE = 'small'
+
+
+def get_image_url(image, variants, variant=SMALL_IMAGE):
+    """Ссылка на уменьшенную копию изображения, пока её нет — на оригинал."""
+    name = variants.get(variant)
+    return image.storage.url(name) if name else image.url
+
+
+def is_subscribed(request, author_id):
+    """
+    Подписан ли пользователь запроса на автора.
+
+    Id авторов, на которых подписан пользователь, загружаются одним
+    запросом и хранятся в запросе до его конца, поэтому списки
+    пользователей и рецептов не делают запрос на каждый объект.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated or user.pk == author_id:
+        return False
+    http_request = getattr(request, '_request', request)
+    subscribed_ids = getattr(http_request, 'subscribed_ids', None)
+    if subscribed_ids is None:
+        subscribed_ids = http_request.subscribed_ids = set(
+            Subscription.objects.filter(user=user)
+            .values_list('subscribed_to_id', flat=True)
+        )
+    return author_id in subscribed_ids
+
+
+class VariantImageField(serializers.ImageField):
+    """
+    Отдаёт уменьшенную копию изображения, если она указана
+    в контексте сериализатора как image_variant.
+    """
+
+    def __init__(self, variants_field, **kwargs):
+        self.variants_field = variants_field
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        variant = self.context.get('image_variant')
+        if not value or not variant:
+            return super().to_representation(value)
+        url = get_image_url(
+            value, getattr(value.instance, self.variants_field), variant
+        )
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Для получения списка пользователей."""
     is_subscribed = serializers.SerializerMethodField()
+    avatar = VariantImageField('avatar_variants',
+                               required=False, allow_null=True)
 
     class Meta:
         model = User
@@ -23,20 +80,16 @@ class UserSerializer(serializers.ModelSerializer):
                   ]
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(user=user,
-                                           subscribed_to=obj).exists()
+        return is_subscribed(self.context.get('request'), obj.pk)
 
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            unique_filename = f'{uuid.uuid4()}.{ext}'
-            data = ContentFile(b64decode(imgstr), name=unique_filename)
+            try:
+                data = decode_base64_image(data)
+            except ImageUploadError as error:
+                raise ValidationError(str(error))
         return super().to_internal_value(data)
 
 
@@ -72,63 +125,41 @@ class SubList(serializers.ModelSerializer):
         ]
 
     def get_avatar(self, obj):
-        return (
-            obj.subscribed_to.avatar.url if obj.subscribed_to.avatar else None
-        )
+        author = obj.subscribed_to
+        if not author.avatar:
+            return None
+        return get_image_url(author.avatar, author.avatar_variants)
 
     def get_is_subscribed(self, obj):
-        user = self.context["request"].user
-        return (
-            not user.is_anonymous
-            and Subscription.objects.filter(
-                user=user,
-                subscribed_to=obj.subscribed_to).exists())
+        # Сериализуются только подписки текущего пользователя.
+        return True
 
     def get_recipes(self, obj):
-        recipes = obj.subscribed_to.recipes.all()
-        recipes_limit = (
-            self.context['request'].query_params.get("recipes_limit")
-        )
-        if recipes_limit:
-            if not recipes_limit.isnumeric():
-                raise ValidationError(
-                    {"recipes_limit": "Invalid recipes_limit parameter."}
-                )
-            recipes = recipes[:int(recipes_limit)]
+        recipes = getattr(obj.subscribed_to, 'recipes_preview', None)
+        if recipes is None:
+            recipes = obj.subscribed_to.recipes.all()
         return [
             {
                 "id": recipe.id,
                 "name": recipe.name,
-                "image": recipe.image.url,
+                "image": get_image_url(recipe.image, recipe.image_variants),
                 "cooking_time": recipe.cooking_time,
             }
             for recipe in recipes
         ]
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.subscribed_to).count()
+        return obj.subscribed_to.recipes_count
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
-    is_subscribed = serializers.SerializerMethodField()
-    recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
-    username = serializers.ReadOnlyField(source="subscribed_to.username")
-    first_name = serializers.ReadOnlyField(source="subscribed_to.first_name")
-    last_name = serializers.ReadOnlyField(source="subscribed_to.last_name")
-    avatar = serializers.SerializerMethodField()
-    email = serializers.ReadOnlyField(source="subscribed_to.email")
     subscribed_to = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(), write_only=True
     )
 
     class Meta:
         model = Subscription
-        fields = [
-            "email", "id", "username", "first_name", "last_name",
-            "is_subscribed", "recipes", "recipes_count",
-            "subscribed_to", "avatar",
-        ]
+        fields = ["subscribed_to"]
 
     def validate(self, data):
         user = self.context["request"].user
@@ -145,43 +176,8 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         data['user'] = user
         return data
 
-    def get_avatar(self, obj):
-        if obj.subscribed_to.avatar:
-            return obj.subscribed_to.avatar.url
-        return None
-
-    def get_is_subscribed(self, obj):
-        user = self.context["request"].user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(user=user,
-                                           subscribed_to=obj.subscribed_to
-                                           ).exists()
-
-    def get_recipes(self, obj):
-        recipes = Recipe.objects.filter(author=obj.subscribed_to)
-        return [
-            {
-                "id": recipe.id,
-                "name": recipe.name,
-                "image": recipe.image.url,
-                "cooking_time": recipe.cooking_time,
-            }
-            for recipe in recipes
-        ]
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.subscribed_to).count()
-
     def to_representation(self, instance):
-        repr = super().to_representation(instance)
-        repr["id"] = instance.subscribed_to.id
-        recipes_limit = (
-            self.context['request'].query_params.get("recipes_limit")
-        )
-        if recipes_limit:
-            repr['recipes'] = repr['recipes'][:int(recipes_limit)]
-        return repr
+        return SubList(instance, context=self.context).data
 
     def create(self, validated_data):
         return Subscription.objects.create(**validated_data)
@@ -201,12 +197,29 @@ class GetOrRetriveIngredientSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "measurement_unit"]
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        recipes = data.all() if hasattr(data, 'all') else data
+        return self.child.to_representation_many(list(recipes))
+
+
 class RecipeListOrRetrieveSerializer(serializers.ModelSerializer):
+    """
+    Рецепт для ленты и страницы рецепта.
+
+    Не зависящая от пользователя часть ответа кэшируется по рецепту
+    вместе с версиями рецепта, автора и каталога. Для страницы берётся
+    одним get_many, а is_favorited, is_in_shopping_cart (аннотации
+    queryset) и author.is_subscribed подставляются для каждого запроса.
+    Связанные объекты загружаются только для рецептов без кэша.
+    """
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
+    image = VariantImageField('image_variants', read_only=True)
     ingredients = serializers.SerializerMethodField()
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Recipe
@@ -214,19 +227,7 @@ class RecipeListOrRetrieveSerializer(serializers.ModelSerializer):
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
             'name', 'image', 'text', 'cooking_time']
-
-    def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return FavoriteRecipe.objects.filter(user=user,
-                                                 recipe=obj).exists()
-        return False
-
-    def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if user.is_authenticated:
-            return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
-        return False
+        list_serializer_class = RecipeListSerializer
 
     def get_ingredients(self, obj):
         return [
@@ -239,9 +240,89 @@ class RecipeListOrRetrieveSerializer(serializers.ModelSerializer):
             for ingredient in obj.ingredients.all()
         ]
 
+    def get_body_key(self, recipe):
+        request = self.context.get('request')
+        base_url = request.build_absolute_uri('/') if request else ''
+        variant = self.context.get('image_variant', '')
+        return f'recipe-body:{base_url}:{variant}:{recipe.pk}'
+
+    def get_body_tags(self, recipe):
+        return [instance_tag(Recipe, recipe.pk),
+                instance_tag(User, recipe.author_id),
+                CATALOG]
+
+    def to_representation(self, instance):
+        return self.to_representation_many([instance])[0]
+
+    def to_representation_many(self, recipes):
+        keys = {recipe.pk: self.get_body_key(recipe) for recipe in recipes}
+        tags = {
+            tag for recipe in recipes for tag in self.get_body_tags(recipe)
+        }
+        entries, versions = get_many_versioned(list(keys.values()), tags)
+        bodies = {}
+        for recipe in recipes:
+            entry = entries.get(keys[recipe.pk])
+            if entry is not None and all(
+                    versions[tag] == entry[0].get(tag)
+                    for tag in self.get_body_tags(recipe)):
+                bodies[recipe.pk] = entry[1]
+        missed = [recipe for recipe in recipes if recipe.pk not in bodies]
+        if missed:
+            prefetch_related_objects(
+                missed, 'author', 'tags',
+                Prefetch('ingredients',
+                         queryset=RecipeIngredient.objects.select_related(
+                             'ingredient')),
+            )
+            new_entries = {}
+            for recipe in missed:
+                body = super().to_representation(recipe)
+                bodies[recipe.pk] = body
+                new_entries[keys[recipe.pk]] = (
+                    {tag: versions[tag] for tag in self.get_body_tags(recipe)},
+                    body,
+                )
+            cache.set_many(new_entries, settings.RECIPE_BODY_CACHE_TIMEOUT)
+        request = self.context.get('request')
+        result = []
+        for recipe in recipes:
+            data = dict(bodies[recipe.pk])
+            data['author'] = {
+                **data['author'],
+                'is_subscribed': is_subscribed(request, recipe.author_id),
+            }
+            data['is_favorited'] = bool(recipe.is_favorited)
+            data['is_in_shopping_cart'] = bool(recipe.is_in_shopping_cart)
+            result.append(data)
+        return result
+
+
+def get_objects_in_bulk(model, pks):
+    """Загружает объекты по списку id одним запросом."""
+    objects = model.objects.in_bulk(pks)
+    for pk in pks:
+        if pk not in objects:
+            raise ValidationError(
+                f'Invalid pk "{pk}" - object does not exist.'
+            )
+    return [objects[pk] for pk in pks]
+
+
+def set_prefetched(instance, name, objects):
+    """
+    Кладёт уже загруженные связанные объекты в кэш prefetch_related,
+    чтобы сериализация не перечитывала их из базы.
+    """
+    queryset = getattr(instance, name).all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    instance.__dict__.setdefault('_prefetched_objects_cache', {})
+    instance._prefetched_objects_cache[name] = queryset
+
 
 class IngredientCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
@@ -250,8 +331,7 @@ class IngredientCreateSerializer(serializers.ModelSerializer):
 
 class RecipePostOrPatchSerializer(serializers.ModelSerializer):
     author = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = IngredientCreateSerializer(many=True)
     image = Base64ImageField(required=True)
 
@@ -267,7 +347,26 @@ class RecipePostOrPatchSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Image must be required')
         return image
 
+    def validate_tags(self, tags):
+        return get_objects_in_bulk(Tag, tags)
+
+    def validate_ingredients(self, ingredients):
+        objects = get_objects_in_bulk(
+            Ingredient, [item['id'] for item in ingredients]
+        )
+        return [
+            {**item, 'id': ingredient}
+            for item, ingredient in zip(ingredients, objects)
+        ]
+
+    def is_image_upload(self):
+        """PATCH с телом image/*: меняется только изображение."""
+        request = self.context['request']
+        return self.partial and request.content_type.startswith('image/')
+
     def validate(self, data):
+        if self.is_image_upload():
+            return data
         ingredient = set()
         tags = set()
         if not data.get('tags'):
@@ -303,88 +402,88 @@ class RecipePostOrPatchSerializer(serializers.ModelSerializer):
             )
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop("ingredients")
+        tags = validated_data['tags']
         recipe = super().create(validated_data)
-        for ingredient_data in ingredients_data:
-            ingredient = ingredient_data.pop("id")
-            RecipeIngredient.objects.create(
-                recipe=recipe,
-                ingredient=ingredient,
-                **ingredient_data,
-            )
-        recipe.refresh_from_db()
+        recipe_ingredients = RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe,
+                             ingredient=item['id'],
+                             amount=item['amount'])
+            for item in ingredients_data
+        )
+        index_recipes([recipe.pk])
+        set_prefetched(recipe, 'tags', tags)
+        set_prefetched(recipe, 'ingredients', recipe_ingredients)
+        recipe.is_favorited = False
+        recipe.is_in_shopping_cart = False
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        if validated_data.get("ingredients"):
-            ingredients_data = validated_data.pop("ingredients")
-
-            for ingredient_data in ingredients_data:
-                ingredient_id = ingredient_data.pop("id")
-                recipe_ingredient, _ = (
-                    RecipeIngredient.objects.update_or_create(
-                        recipe=instance,
-                        ingredient_id=ingredient_id,
-                        defaults=ingredient_data,
-                    ))
+        ingredients_data = validated_data.pop("ingredients", None)
+        tags = validated_data.get('tags')
         super().update(instance, validated_data)
-
+        if tags is not None:
+            set_prefetched(instance, 'tags', tags)
+        if ingredients_data is not None:
+            set_prefetched(instance, 'ingredients',
+                           self.sync_ingredients(instance, ingredients_data))
+        index_recipes([instance.pk])
         return instance
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        request = self.context.get('request')
-        current_user = request.user
-
-        representation['id'] = instance.id
-
-        # Проверка подписки
-        is_subscribed = Subscription.objects.filter(
-            user=current_user,
-            subscribed_to=instance.author).exists()
-        representation['author'] = {
-            "email": instance.author.email,
-            "id": instance.author.id,
-            "username": instance.author.username,
-            "first_name": instance.author.first_name,
-            "last_name": instance.author.last_name,
-            "is_subscribed": is_subscribed,
-            "avatar": (
-                instance.author.avatar.url
-                if instance.author.avatar
-                else None
-            )}
-
-        representation['tags'] = [
-            {
-                "id": tag.id,
-                "name": tag.name,
-                "slug": tag.slug
-            } for tag in instance.tags.all()
-        ]
-
-        representation['ingredients'] = [
-            {
-                "id": ingredient.ingredient.id,
-                "name": ingredient.ingredient.name,
-                "measurement_unit": ingredient.ingredient.unit,
-                "amount": ingredient.amount
-            } for ingredient in instance.ingredients.all()
-        ]
+    def sync_ingredients(self, recipe, ingredients_data):
+        """
+        Приводит ингредиенты рецепта к переданному списку: одна вставка,
+        одно обновление и одно удаление вне зависимости от их числа.
+        """
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe)
+        }
+        recipe_ingredients = []
+        to_create = []
+        to_update = []
+        for item in ingredients_data:
+            ingredient = item['id']
+            recipe_ingredient = current.pop(ingredient.id, None)
+            if recipe_ingredient is None:
+                recipe_ingredient = RecipeIngredient(recipe=recipe,
+                                                     ingredient=ingredient,
+                                                     amount=item['amount'])
+                to_create.append(recipe_ingredient)
+            else:
+                recipe_ingredient.ingredient = ingredient
+                if recipe_ingredient.amount != item['amount']:
+                    recipe_ingredient.amount = item['amount']
+                    to_update.append(recipe_ingredient)
+            recipe_ingredients.append(recipe_ingredient)
+        if current:
+            RecipeIngredient.objects.filter(
+                pk__in=[item.pk for item in current.values()]
+            ).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        return recipe_ingredients
 
-        representation['image'] = (
-            request.build_absolute_uri(instance.image.url)
-        )
-        representation['is_favorited'] = (
-            FavoriteRecipe.objects.filter(
-                user=current_user, recipe=instance).exists()
-        )
-        representation['is_in_shopping_cart'] = (
-            ShoppingCart.objects.filter(
-                user=current_user, recipe=instance).exists()
-        )
-        return representation
+    def to_representation(self, instance):
+        if not hasattr(instance, 'is_favorited'):
+            user = self.context['request'].user
+            flags = Recipe.objects.filter(pk=instance.pk).values(
+                is_favorited=Exists(FavoriteRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+            ).get()
+            instance.is_favorited = flags['is_favorited']
+            instance.is_in_shopping_cart = flags['is_in_shopping_cart']
+        return RecipeListOrRetrieveSerializer(
+            instance, context=self.context
+        ).data
 
 
 class RecipeLinkSerializer(serializers.ModelSerializer):
@@ -422,14 +521,14 @@ class FavoriteSerializer(serializers.ModelSerializer):
         return {
             'id': recipe.id,
             'name': recipe.name,
-            'image': recipe.image.url,
+            'image': get_image_url(recipe.image, recipe.image_variants),
             'cooking_time': recipe.cooking_time
         }
 
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='recipe.id')
-    image = serializers.ReadOnlyField(source='recipe.image.url')
+    image = serializers.SerializerMethodField()
     name = serializers.ReadOnlyField(source='recipe.name')
     cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
 
@@ -437,6 +536,9 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         model = ShoppingCart
         fields = ['id', 'image', 'name', 'cooking_time']
 
+    def get_image(self, obj):
+        return get_image_url(obj.recipe.image, obj.recipe.image_variants)
+
     def create(self, validated_data):
         user = validated_data['user']
         recipe = validated_data['recipe']
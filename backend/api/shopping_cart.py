@@ -0,0 +1,186 @@
+import csv
+import hashlib
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, Spacer
+
+from foodgram.models import RecipeIngredient
+
+TITLE = "Shopping Cart Ingredients:"
+PDF_FONT_NAME = 'ShoppingListFont'
+DEFAULT_PDF_FONT = 'Helvetica'
+# Меняется при изменении вида файлов, чтобы не отдавать старый кэш.
+RENDER_VERSION = '1'
+
+_pdf_font = None
+
+
+def get_shopping_cart_ingredients(user):
+    """Суммирует ингредиенты корзины пользователя одним GROUP BY."""
+    return (
+        RecipeIngredient.objects
+        .filter(recipe__shopping_cart_by__user=user)
+        .values('ingredient__name', 'ingredient__unit')
+        .annotate(total_amount=Sum('amount'))
+        .order_by('ingredient__name')
+    )
+
+
+def render_txt(ingredients):
+    yield f"{TITLE}\n\n"
+    for item in ingredients:
+        yield (
+            f"{item['ingredient__name']}: "
+            f"{item['total_amount']} {item['ingredient__unit']}\n"
+        )
+
+
+def render_csv(ingredients):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['name', 'amount', 'measurement_unit'])
+    for item in ingredients:
+        writer.writerow([item['ingredient__name'],
+                         item['total_amount'],
+                         item['ingredient__unit']])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def get_pdf_font():
+    """Регистрирует TTF-шрифт с кириллицей, если он есть в системе."""
+    global _pdf_font
+    if _pdf_font is None:
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if font_path and os.path.exists(font_path):
+            pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, font_path))
+            _pdf_font = PDF_FONT_NAME
+        else:
+            _pdf_font = DEFAULT_PDF_FONT
+    return _pdf_font
+
+
+def write_pdf(ingredients, file):
+    font = get_pdf_font()
+    styles = getSampleStyleSheet()
+    title_style = styles['Title'].clone('ShoppingListTitle', fontName=font)
+    rows = [['Ингредиент', 'Количество', 'Ед. изм.']]
+    rows.extend(
+        [item['ingredient__name'], item['total_amount'],
+         item['ingredient__unit']]
+        for item in ingredients
+    )
+    table = LongTable(rows, colWidths=[300, 90, 90], repeatRows=1)
+    table.setStyle([
+        ('FONTNAME', (0, 0), (-1, -1), font),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
+    ])
+    document = SimpleDocTemplate(file, pagesize=A4, title=TITLE)
+    document.build([Paragraph(TITLE, title_style), Spacer(1, 12), table])
+
+
+def write_lines(render):
+    def writer(ingredients, file):
+        for line in render(ingredients):
+            file.write(line.encode('utf-8'))
+    return writer
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', write_lines(render_txt)),
+    'csv': ('text/csv; charset=utf-8', write_lines(render_csv)),
+    'pdf': ('application/pdf', write_pdf),
+}
+
+
+def get_cache_dir():
+    cache_dir = Path(settings.SHOPPING_LIST_CACHE_DIR)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def get_cart_digest(ingredients, file_format):
+    digest = hashlib.sha256(f'{RENDER_VERSION}:{file_format}'.encode())
+    for item in ingredients:
+        digest.update(
+            f"\n{item['ingredient__name']}\t{item['total_amount']}\t"
+            f"{item['ingredient__unit']}".encode('utf-8')
+        )
+    return digest.hexdigest()
+
+
+def prune_cache(cache_dir):
+    """Удаляет файлы, к которым давно не обращались."""
+    expires = time.time() - settings.SHOPPING_LIST_CACHE_MAX_AGE
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.stat().st_mtime < expires:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def render_file(path, writer, ingredients):
+    handle, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            writer(ingredients, file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    prune_cache(path.parent)
+    return path
+
+
+def wait_for_file(path):
+    deadline = time.monotonic() + settings.SHOPPING_LIST_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        if path.exists():
+            return True
+    return False
+
+
+def get_shopping_list_file(user, file_format):
+    """
+    Возвращает путь к файлу со списком покупок.
+
+    Файл кэшируется на диске по хэшу содержимого корзины: повторная
+    загрузка той же корзины отдаёт готовый файл. Одинаковые запросы
+    рендерят его один раз: остальные ждут файл, пока держится
+    блокировка в кэше.
+    """
+    ingredients = list(get_shopping_cart_ingredients(user))
+    digest = get_cart_digest(ingredients, file_format)
+    path = get_cache_dir() / f'{digest}.{file_format}'
+    if path.exists():
+        os.utime(path)
+        return path
+    _, writer = SHOPPING_LIST_FORMATS[file_format]
+    lock_key = f'shopping-list:{digest}:{file_format}:lock'
+    if cache.add(lock_key, 1, settings.SHOPPING_LIST_LOCK_TIMEOUT):
+        try:
+            return render_file(path, writer, ingredients)
+        finally:
+            cache.delete(lock_key)
+    # Тот же файл рендерит другой запрос.
+    if wait_for_file(path):
+        return path
+    return render_file(path, writer, ingredients)
@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from foodgram.models import Recipe
+
+MISSING = object()
+
+
+class ShortLinkCache:
+    """
+    Ограниченный LRU-кэш «короткий код -> id рецепта» в памяти процесса.
+
+    Несуществующие коды тоже кэшируются, но только на
+    SHORT_LINK_NEGATIVE_TTL секунд: рецепт с таким кодом мог быть
+    создан в другом процессе.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._links = OrderedDict()
+        self._warmed = False
+
+    def _store(self, code, value):
+        with self._lock:
+            self._links[code] = value
+            self._links.move_to_end(code)
+            while len(self._links) > settings.SHORT_LINK_CACHE_SIZE:
+                self._links.popitem(last=False)
+
+    def _lookup(self, code):
+        with self._lock:
+            value = self._links.get(code, MISSING)
+            if value is MISSING:
+                return MISSING
+            if isinstance(value, float):
+                if value < time.monotonic():
+                    del self._links[code]
+                    return MISSING
+                return None
+            self._links.move_to_end(code)
+            return value
+
+    def add(self, code, recipe_id):
+        self._store(code, recipe_id)
+
+    def remove(self, code):
+        self._store(
+            code, time.monotonic() + settings.SHORT_LINK_NEGATIVE_TTL
+        )
+
+    def warm(self):
+        """Загружает коды самых новых рецептов одним запросом."""
+        links = (
+            Recipe.objects.exclude(short_url=None)
+            .order_by('-id')
+            .values_list('short_url', 'id')
+            [:settings.SHORT_LINK_CACHE_SIZE]
+        )
+        for code, recipe_id in reversed(links):
+            self._store(code, recipe_id)
+        self._warmed = True
+
+    def resolve(self, code):
+        """Возвращает id рецепта по короткому коду или None."""
+        if not self._warmed:
+            self.warm()
+        recipe_id = self._lookup(code)
+        if recipe_id is MISSING:
+            recipe_id = (
+                Recipe.objects.filter(short_url=code)
+                .values_list('id', flat=True).first()
+            )
+            if recipe_id is None:
+                self.remove(code)
+            else:
+                self.add(code, recipe_id)
+        return recipe_id
+
+
+short_link_cache = ShortLinkCache()
@@ -0,0 +1,96 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from foodgram.models import (FavoriteRecipe, Ingredient, Recipe,
+                             RecipeIngredient, ShoppingCart, Subscription, Tag,
+                             User)
+from foodgram.signals import recipe_related_saved
+
+from .cache import CATALOG, COUNTS, bump_instance, bump_version
+from .counters import update_counters
+from .images import schedule_variants
+from .search import index_recipes, remove_recipes
+from .short_links import short_link_cache
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def catalog_changed(**kwargs):
+    bump_version(CATALOG)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(instance, created, **kwargs):
+    if not created:
+        index_recipes(
+            RecipeIngredient.objects.filter(ingredient=instance)
+            .values_list('recipe_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def counts_changed(**kwargs):
+    bump_version(COUNTS)
+
+
+# Сигналы приходят и при каскадном удалении (пользователя, рецепта)
+# и из админки, поэтому счётчики не зависят от пути изменения.
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+def counted_saved(sender, instance, created, **kwargs):
+    if created:
+        update_counters(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def counted_deleted(sender, instance, **kwargs):
+    update_counters(sender, instance, -1)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def instance_changed(sender, instance, **kwargs):
+    bump_instance(sender, instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, update_fields=None, **kwargs):
+    if instance.short_url:
+        short_link_cache.add(instance.short_url, instance.pk)
+    if update_fields is None or 'image' in update_fields:
+        schedule_variants(instance, 'image', 'image_variants')
+
+
+@receiver(recipe_related_saved, sender=Recipe)
+def recipe_related_changed(instance, **kwargs):
+    index_recipes([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    if instance.short_url:
+        short_link_cache.remove(instance.short_url)
+    remove_recipes([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, update_fields=None, **kwargs):
+    if update_fields is None or 'avatar' in update_fields:
+        schedule_variants(instance, 'avatar', 'avatar_variants')
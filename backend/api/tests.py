@@ -0,0 +1,692 @@
+import json
+import random
+import shutil
+import tempfile
+from base64 import (b64encode, encodebytes, urlsafe_b64decode,
+                    urlsafe_b64encode)
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from foodgram.models import (FavoriteRecipe, Ingredient, Recipe,
+                             RecipeIngredient, ShoppingCart, Tag, User)
+from foodgram.synthetic import seed_dataset, synthetic_users
+
+from .benchmark import ENDPOINTS, get_context
+from .counters import reconcile_counters
+from .ingredient_index import IngredientIndex
+from .parsers import ORJSONParser
+from .query_budget import QueryBudgetMixin, explain
+from .renderers import ORJSONRenderer
+from .trending import update_trending
+
+# Сколько SQL-запросов может сделать один запрос к эндпоинту при
+# пустом кэше. Бюджет один для обоих наборов данных: число запросов
+# не должно зависеть от размера страницы и числа связей.
+QUERY_BUDGETS = {
+    'recipes list (anonymous)': 5,
+    'recipes list': 7,
+    'recipes list (favorited)': 7,
+    'recipe detail': 6,
+    'favorite add': 10,
+    'favorite remove': 7,
+    'shopping cart add': 7,
+    'shopping cart remove': 7,
+    'shopping cart download': 2,
+    'ingredients list': 2,
+    'ingredients search': 3,
+    'users list': 3,
+    'user detail': 3,
+    'subscriptions': 4,
+    'subscribe': 10,
+    'unsubscribe': 7,
+}
+# Время ответа, мс: ловит только грубые регрессии.
+TIME_BUDGET = 1000
+MEDIA_ROOT = tempfile.mkdtemp()
+PAGE_QUERY = (
+    'SELECT "foodgram_recipe"."id"', 'SELECT DISTINCT "foodgram_recipe"."id"'
+)
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Бюджеты на маленьком наборе: рецептов меньше размера страницы,
+    у каждого один ингредиент.
+    """
+    dataset = {
+        'users': 4,
+        'recipes': 3,
+        'ingredients_per_recipe': 1,
+        'favorites': 1,
+        'carts': 1,
+        'subscriptions': 1,
+        'ingredients': 20,
+    }
+    pages_filled = False
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(**cls.dataset)
+        call_command('reconcile_counters', stdout=StringIO())
+
+    def setUp(self):
+        cache.clear()
+        self.context = get_context()
+        self.user_client = APIClient()
+        self.user_client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.context["token"]}'
+        )
+        self.anonymous_client = APIClient()
+
+    def test_query_budgets(self):
+        for endpoint in ENDPOINTS:
+            if endpoint.name not in QUERY_BUDGETS:
+                continue
+            client = (
+                self.anonymous_client if endpoint.anonymous
+                else self.user_client
+            )
+            cache.clear()
+            with self.subTest(endpoint.name):
+                response = self.assertWithinBudget(
+                    endpoint.name,
+                    QUERY_BUDGETS[endpoint.name],
+                    getattr(client, endpoint.method),
+                    endpoint.path.format(**self.context),
+                    endpoint.get_data(self.context),
+                    format='json',
+                    time_budget=TIME_BUDGET,
+                )
+                self.assertLess(response.status_code, 300)
+
+    def test_page_fill(self):
+        results = self.user_client.get('/api/recipes/').json()['results']
+        self.assertEqual(
+            len(results) == api_settings.PAGE_SIZE, self.pages_filled
+        )
+
+
+class LargeDatasetQueryBudgetTests(QueryBudgetTests):
+    """Те же бюджеты, когда страницы и списки связей заполнены."""
+    dataset = {
+        'users': 40,
+        'recipes': 200,
+        'ingredients_per_recipe': 12,
+        'favorites': 15,
+        'carts': 10,
+        'subscriptions': 8,
+        'ingredients': 100,
+    }
+    pages_filled = True
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class KeysetPaginationTests(TestCase):
+    """Курсорная пагинация: обход вперёд и назад, равные ключи, порча."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=3, recipes=11, favorites=0, carts=0,
+                     subscriptions=0, ingredients=10)
+        # Половина рецептов с одинаковой датой: порядок решает id.
+        tied = Recipe.objects.order_by('pk')[:6].values_list('pk', flat=True)
+        Recipe.objects.filter(pk__in=list(tied)).update(
+            date_created=timezone.now()
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(synthetic_users().first())
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def walk(self, url, link):
+        """id рецептов по страницам, пока есть ссылка link."""
+        pages = []
+        while url:
+            page = self.get_page(url)
+            pages.append([recipe['id'] for recipe in page['results']])
+            url = page[link]
+        return pages
+
+    def test_round_trip(self):
+        # Без избранного и корзин у всех рецептов популярность 0.
+        orderings = {
+            '': Recipe.objects.order_by('-date_created', '-id'),
+            'popular': Recipe.objects.order_by('-id'),
+        }
+        for ordering, expected in orderings.items():
+            with self.subTest(ordering=ordering):
+                url = (f'/api/recipes/?pagination=cursor&limit=4'
+                       f'&ordering={ordering}')
+                forward = self.walk(url, 'next')
+                self.assertEqual([len(page) for page in forward], [4, 4, 3])
+                self.assertEqual(
+                    [pk for page in forward for pk in page],
+                    list(expected.values_list('pk', flat=True))
+                )
+                last = self.get_page(url)
+                while last['next']:
+                    last = self.get_page(last['next'])
+                backward = self.walk(last['previous'], 'previous')
+                self.assertEqual(backward[::-1], forward[:-1])
+
+    def test_cursor_keeps_microseconds(self):
+        page = self.get_page('/api/recipes/?pagination=cursor&limit=1')
+        cursor = parse_qs(urlparse(page['next']).query)['cursor'][0]
+        (date_created, pk), reverse = json.loads(urlsafe_b64decode(cursor))
+        recipe = Recipe.objects.get(pk=pk)
+        self.assertEqual(date_created, recipe.date_created.isoformat())
+        self.assertFalse(reverse)
+
+    def test_invalid_cursor(self):
+        cursors = [
+            'не-курсор',
+            urlsafe_b64encode(b'{"a": 1}').decode(),
+            urlsafe_b64encode(b'[[1], false]').decode(),
+            urlsafe_b64encode(b'[["not a date", 1], false]').decode(),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor):
+                response = self.client.get(
+                    '/api/recipes/', {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeFilterPlanTests(TestCase):
+    """
+    Планы запроса страницы ленты: фильтры идут через EXISTS по индексам,
+    без DISTINCT и сортировки во временном B-дереве.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=5, recipes=20, favorites=0, carts=0,
+                     subscriptions=0, ingredients=20)
+        cls.user = synthetic_users().order_by('pk').first()
+        recipes = Recipe.objects.order_by('pk')[:3]
+        FavoriteRecipe.objects.bulk_create(
+            FavoriteRecipe(user=cls.user, recipe=recipe) for recipe in recipes
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=cls.user, recipe=recipe) for recipe in recipes
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_page_plan(self, path):
+        """План запроса, выбирающего страницу рецептов."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['results'])
+        sql = next(
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith(PAGE_QUERY)
+        )
+        return '\n'.join(explain(sql))
+
+    def assertFeedPlan(self, plan):
+        self.assertIn('recipe_feed_idx', plan)
+        self.assertNotIn('USE TEMP B-TREE FOR DISTINCT', plan)
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_default_feed(self):
+        self.assertFeedPlan(self.get_page_plan('/api/recipes/'))
+
+    def test_tags_filter(self):
+        plan = self.get_page_plan('/api/recipes/?tags=lunch&tags=dinner')
+        self.assertFeedPlan(plan)
+        self.assertNotIn('SCAN U0', plan)
+
+    def test_favorited_filter(self):
+        plan = self.get_page_plan('/api/recipes/?is_favorited=1')
+        self.assertFeedPlan(plan)
+        self.assertNotIn('SCAN U0', plan)
+
+    def test_shopping_cart_filter(self):
+        plan = self.get_page_plan('/api/recipes/?is_in_shopping_cart=1')
+        self.assertFeedPlan(plan)
+        self.assertNotIn('SCAN U0', plan)
+
+    def test_favorites_by_date(self):
+        plan = FavoriteRecipe.objects.filter(
+            user=self.user
+        ).order_by('-added_at').explain()
+        self.assertIn('favorite_user_added_idx', plan)
+        self.assertNotIn('USE TEMP B-TREE', plan)
+
+
+def png_file(name='image.png'):
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), (200, 80, 40)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_PIPELINE_ASYNC=False)
+class RecipeUploadTests(TestCase):
+    """Загрузка изображений формами, строкой base64 и телом image/*."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch')
+        cls.ingredient = Ingredient.objects.create(name='Мука', unit='г')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self):
+        return self.client.post('/api/recipes/', {
+            'name': 'Блины',
+            'text': 'Смешать и испечь.',
+            'cooking_time': 20,
+            'tags': self.tag.pk,
+            'ingredients': json.dumps(
+                [{'id': self.ingredient.pk, 'amount': 200}]
+            ),
+            'image': png_file(),
+        }, format='multipart')
+
+    def test_single_tag_form(self):
+        response = self.create_recipe()
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(
+            [tag['id'] for tag in response.json()['tags']], [self.tag.pk]
+        )
+
+    def test_image_body_patch(self):
+        recipe_id = self.create_recipe().json()['id']
+        response = self.client.patch(
+            f'/api/recipes/{recipe_id}/',
+            png_file().read(),
+            content_type='image/png',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        recipe = Recipe.objects.get(pk=recipe_id)
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertEqual(recipe.ingredients.count(), 1)
+
+    def test_urlencoded_avatar(self):
+        response = self.client.put(
+            '/api/users/me/avatar/',
+            urlencode({'avatar': 'data:image/png;base64,' + b64encode(
+                png_file().read()
+            ).decode()}),
+            content_type='application/x-www-form-urlencoded',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_wrapped_base64_image(self):
+        # Шум почти не сжимается: картинка больше куска декодирования.
+        rng = random.Random(0)
+        buffer = BytesIO()
+        Image.frombytes(
+            'RGB', (300, 300), bytes(rng.getrandbits(8) for _ in range(270000))
+        ).save(buffer, 'PNG')
+        self.assertGreater(len(buffer.getvalue()), 256 * 1024)
+        response = self.client.post('/api/recipes/', {
+            'name': 'Блины',
+            'text': 'Смешать и испечь.',
+            'cooking_time': 20,
+            'tags': [self.tag.pk],
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 200}],
+            # encodebytes переносит строки через 76 символов.
+            'image': 'data:image/png;base64,'
+                     + encodebytes(buffer.getvalue()).decode(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_PIPELINE_ASYNC=False)
+class RecipeCacheTests(TestCase):
+    """Закэшированное тело рецепта обновляется после коммита изменений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch')
+        cls.flour, cls.milk = Ingredient.objects.bulk_create([
+            Ingredient(name='Мука', unit='г'),
+            Ingredient(name='Молоко', unit='мл'),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_ingredients_update(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe_id = self.client.post('/api/recipes/', {
+                'name': 'Блины',
+                'text': 'Смешать и испечь.',
+                'cooking_time': 20,
+                'tags': self.tag.pk,
+                'ingredients': json.dumps(
+                    [{'id': self.flour.pk, 'amount': 200}]
+                ),
+                'image': png_file(),
+            }, format='multipart').json()['id']
+        path = f'/api/recipes/{recipe_id}/'
+        self.client.get(path)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(path, {
+                'name': 'Блины',
+                'text': 'Смешать и испечь.',
+                'cooking_time': 20,
+                'tags': [self.tag.pk],
+                'ingredients': [{'id': self.milk.pk, 'amount': 300}],
+            }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        ingredients = self.client.get(path).json()['ingredients']
+        self.assertEqual(
+            [(item['id'], item['amount']) for item in ingredients],
+            [(self.milk.pk, 300)]
+        )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, TRENDING_COMMIT_LAG=0)
+class TrendingTests(TestCase):
+    """Повторное добавление в избранное не поднимает рейтинг."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=2, recipes=1, favorites=0, carts=0,
+                     subscriptions=0, ingredients=5)
+        cls.first, cls.second = synthetic_users().order_by('pk')
+        cls.recipe = Recipe.objects.get()
+
+    def get_score(self):
+        update_trending(batch_size=2)
+        return Recipe.objects.get(pk=self.recipe.pk).trending_score
+
+    def test_toggle_counted_once(self):
+        FavoriteRecipe.objects.create(user=self.first, recipe=self.recipe)
+        score = self.get_score()
+        for _ in range(3):
+            FavoriteRecipe.objects.filter(user=self.first).delete()
+            FavoriteRecipe.objects.create(
+                user=self.first, recipe=self.recipe
+            )
+        self.assertEqual(self.get_score(), score)
+        FavoriteRecipe.objects.create(user=self.second, recipe=self.recipe)
+        self.assertGreater(self.get_score(), score)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT,
+                   SHOPPING_LIST_CACHE_DIR=f'{MEDIA_ROOT}/shopping_lists')
+class ShoppingListTests(TestCase):
+    """Список покупок рендерится один раз на содержимое корзины."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=2, recipes=3, favorites=0, carts=2,
+                     subscriptions=0, ingredients=10)
+        cls.user = synthetic_users().filter(
+            shopping_cart_recipes__isnull=False
+        ).first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?format=txt'
+        )
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_cached_file(self):
+        first = self.download()
+        self.assertIn(b'Shopping Cart Ingredients:', first)
+        with patch('api.shopping_cart.render_file') as render_file:
+            self.assertEqual(self.download(), first)
+        render_file.assert_not_called()
+
+
+class CounterTests(TestCase):
+    """Счётчики верны и после изменений в обход API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=6, recipes=10, favorites=3, carts=2,
+                     subscriptions=2, ingredients=10)
+        call_command('reconcile_counters', stdout=StringIO())
+
+    def assertCountersFresh(self):
+        for model in (Recipe, User):
+            with self.subTest(model.__name__):
+                self.assertEqual(reconcile_counters(model, 100), 0)
+
+    def test_orm_changes(self):
+        user, other = synthetic_users().order_by('pk')[:2]
+        recipe = Recipe.objects.exclude(favorited_by__user=user).first()
+        FavoriteRecipe.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.filter(user=other).delete()
+        self.assertCountersFresh()
+
+    def test_cascades(self):
+        Recipe.objects.filter(favorited_by__isnull=False).first().delete()
+        synthetic_users().filter(recipes__isnull=False).first().delete()
+        self.assertCountersFresh()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ShortLinkTests(TestCase):
+    """Короткие ссылки рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=1, recipes=1, favorites=0, carts=0,
+                     subscriptions=0, ingredients=5)
+        cls.user = synthetic_users().get()
+
+    def test_codes_are_unique(self):
+        pks = range(1, 100001)
+        codes = {Recipe.generate_short_url(pk) for pk in pks}
+        self.assertEqual(len(codes), len(pks))
+        self.assertEqual({len(code) for code in codes}, {6})
+
+    def test_single_post_save_on_create(self):
+        handler = Mock()
+        post_save.connect(handler, sender=Recipe, weak=False)
+        try:
+            recipe = Recipe.objects.create(
+                author=self.user, name='Блины', text='Испечь.',
+                cooking_time=20, image='recipes/images/synthetic.png'
+            )
+        finally:
+            post_save.disconnect(handler, sender=Recipe)
+        self.assertEqual(handler.call_count, 1)
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).short_url,
+            Recipe.generate_short_url(recipe.pk)
+        )
+
+    def test_link_resolves(self):
+        recipe = Recipe.objects.get()
+        client = APIClient()
+        link = client.get(f'/api/recipes/{recipe.pk}/get-link/').json()
+        response = client.get(urlparse(link['short-link']).path)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(
+            response['Location'].endswith(f'/recipes/{recipe.pk}')
+        )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_PIPELINE_ASYNC=False)
+class RecipeAdminTests(TestCase):
+    """Рецепт из админки попадает в поиск вместе с ингредиентами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='x'
+        )
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch')
+        cls.ingredient = Ingredient.objects.create(name='Сгущёнка', unit='г')
+
+    def test_add_recipe_indexes_ingredients(self):
+        self.client.force_login(self.admin)
+        response = self.client.post('/admin/foodgram/recipe/add/', {
+            'name': 'Блины',
+            'text': 'Смешать и испечь.',
+            'cooking_time': 20,
+            'author': self.admin.pk,
+            'tags': [self.tag.pk],
+            'image': png_file(),
+            'ingredients-TOTAL_FORMS': 1,
+            'ingredients-INITIAL_FORMS': 0,
+            'ingredients-MIN_NUM_FORMS': 1,
+            'ingredients-MAX_NUM_FORMS': 1000,
+            'ingredients-0-ingredient': self.ingredient.pk,
+            'ingredients-0-amount': 100,
+        })
+        self.assertEqual(response.status_code, 302)
+        results = APIClient().get('/api/recipes/?name=сгущ').json()['results']
+        self.assertEqual([recipe['name'] for recipe in results], ['Блины'])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class JSONFormatTests(TestCase):
+    """orjson-рендерер и парсер совпадают со стандартными DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=3, recipes=4, favorites=1, carts=1,
+                     subscriptions=1, ingredients=10)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(synthetic_users().first())
+
+    def test_recipe_payload(self):
+        data = self.client.get('/api/recipes/').data
+        data['extra'] = {
+            'amount': Decimal('1.50'),
+            'added_at': timezone.now(),
+            'label': gettext_lazy('Рецепт'),
+            'text': 'строка\u2028и «кавычки» "внутри"',
+            'ratio': 0.1,
+            1: None,
+        }
+        self.assertEqual(
+            ORJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+
+    def test_parser(self):
+        body = JSONRenderer().render(self.client.get('/api/recipes/').data)
+        self.assertEqual(
+            ORJSONParser().parse(BytesIO(body)),
+            JSONParser().parse(BytesIO(body)),
+        )
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(BytesIO(b'{"name": '))
+
+
+class IngredientIndexTests(TestCase):
+    """Поиск ингредиентов по префиксу в индексе в памяти."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sugar, cls.powder, cls.vanilla, cls.hedgehog = (
+            Ingredient.objects.bulk_create([
+                Ingredient(name='Сахар', unit='г'),
+                Ingredient(name='Сахарная пудра', unit='г'),
+                Ingredient(name='Ванильный сахар', unit='г'),
+                Ingredient(name='Ёжевика', unit='г'),
+            ])
+        )
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(author=author, name=f'Рецепт {number}', text='Смешать.',
+                   cooking_time=10, image='recipes/images/synthetic.png')
+            for number in range(2)
+        )
+        RecipeIngredient.objects.create(
+            recipe=cls.recipes[0], ingredient=cls.powder, amount=10
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.index = IngredientIndex()
+
+    def names(self, query):
+        return [item['name'] for item in self.index.search(query)]
+
+    def test_prefix_ranking(self):
+        # Начало названия раньше начала слова, среди них — частые раньше.
+        self.assertEqual(
+            self.names('сах'),
+            ['Сахарная пудра', 'Сахар', 'Ванильный сахар']
+        )
+        self.assertEqual(self.names('пуд'), ['Сахарная пудра'])
+        self.assertEqual(self.names('  '), [])
+
+    def test_case_folding(self):
+        self.assertEqual(self.names('САХАРН'), ['Сахарная пудра'])
+        self.assertEqual(self.names('еж'), ['Ёжевика'])
+        self.assertEqual(self.names('ЁЖ'), ['Ёжевика'])
+
+    def test_rebuild_on_catalog_change(self):
+        self.assertEqual(self.names('ваниль'), ['Ванильный сахар'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vanilla.name = 'Ванилин'
+            self.vanilla.save()
+        self.assertEqual(self.names('ваниль'), [])
+        self.assertEqual(self.names('ванил'), ['Ванилин'])
+
+    def test_rebuild_after_ttl(self):
+        self.assertEqual(self.names('сах')[0], 'Сахарная пудра')
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=self.sugar, amount=5)
+            for recipe in self.recipes
+        )
+        # Частота не меняет версию каталога: до TTL порядок прежний.
+        self.assertEqual(self.names('сах')[0], 'Сахарная пудра')
+        with override_settings(INGREDIENT_INDEX_TTL=0):
+            self.assertEqual(self.names('сах')[0], 'Сахар')
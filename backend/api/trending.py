@@ -0,0 +1,105 @@
+import math
+from datetime import timedelta
+from itertools import takewhile
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from foodgram.constants import TRENDING_EPOCH, TRENDING_WEIGHTS
+from foodgram.models import (FavoriteRecipe, Recipe, ShoppingCart,
+                             TrendingCheckpoint, TrendingEvent)
+
+TRENDING_SOURCES = {
+    'favorites': FavoriteRecipe,
+    'carts': ShoppingCart,
+}
+
+
+def event_score(added_at, weight):
+    """
+    log2 вклада события в рейтинг.
+
+    Вклад удваивается за каждый TRENDING_HALF_LIFE от TRENDING_EPOCH:
+    это то же, что делить старые вклады пополам, но рейтинг уже
+    учтённых событий не нужно пересчитывать со временем.
+    """
+    age = (added_at - TRENDING_EPOCH).total_seconds()
+    return age / settings.TRENDING_HALF_LIFE + math.log2(weight)
+
+
+def add_scores(first, second):
+    """log2(2 ** first + 2 ** second) без переполнения."""
+    high, low = max(first, second), min(first, second)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+@transaction.atomic
+def process_batch(source, batch_size, cutoff):
+    """
+    Учитывает следующую порцию событий источника после отметки.
+
+    Пара пользователь — рецепт входит в рейтинг один раз: иначе
+    удаление и повторное добавление накручивали бы его. Возвращает
+    число просмотренных событий; меньше batch_size — значит, новых
+    событий старше cutoff больше нет.
+    """
+    checkpoint, _ = (
+        TrendingCheckpoint.objects.select_for_update()
+        .get_or_create(source=source)
+    )
+    events = list(takewhile(
+        lambda event: event[3] <= cutoff,
+        TRENDING_SOURCES[source].objects
+        .filter(pk__gt=checkpoint.last_id)
+        .order_by('pk')
+        .values_list('pk', 'user_id', 'recipe_id', 'added_at')[:batch_size]
+    ))
+    if not events:
+        return 0
+    counted = set(
+        TrendingEvent.objects.filter(
+            source=source,
+            user_id__in={user_id for _, user_id, _, _ in events},
+            recipe_id__in={recipe_id for _, _, recipe_id, _ in events},
+        ).values_list('user_id', 'recipe_id')
+    )
+    weight = TRENDING_WEIGHTS[source]
+    scores = {}
+    new_events = []
+    for pk, user_id, recipe_id, added_at in events:
+        checkpoint.last_id = pk
+        if (user_id, recipe_id) in counted:
+            continue
+        counted.add((user_id, recipe_id))
+        new_events.append(TrendingEvent(
+            source=source, user_id=user_id, recipe_id=recipe_id
+        ))
+        score = event_score(added_at, weight)
+        if recipe_id in scores:
+            score = add_scores(scores[recipe_id], score)
+        scores[recipe_id] = score
+    TrendingEvent.objects.bulk_create(new_events, ignore_conflicts=True)
+    recipes = list(
+        Recipe.objects.filter(pk__in=scores).only('pk', 'trending_score')
+    )
+    for recipe in recipes:
+        recipe.trending_score = add_scores(
+            recipe.trending_score, scores[recipe.pk]
+        )
+    Recipe.objects.bulk_update(recipes, ['trending_score'])
+    checkpoint.save(update_fields=['last_id'])
+    return len(events)
+
+
+def update_trending(batch_size):
+    """Учитывает все новые события порциями по batch_size."""
+    cutoff = timezone.now() - timedelta(seconds=settings.TRENDING_COMMIT_LAG)
+    total = 0
+    for source in TRENDING_SOURCES:
+        while True:
+            processed = process_batch(source, batch_size, cutoff)
+            total += processed
+            if processed < batch_size:
+                break
+    return total
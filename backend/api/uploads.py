@@ -0,0 +1,191 @@
+import binascii
+import json
+import tempfile
+import uuid
+from base64 import b64decode
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http import QueryDict
+from django.http.multipartparser import MultiPartParserError
+from PIL import Image
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, DataAndFiles
+
+# Размер куска при чтении тела запроса и декодировании base64
+# (кратен 4, чтобы куски base64 декодировались независимо).
+CHUNK_SIZE = 64 * 1024
+# Сколько байт начала файла можно прочитать в поисках заголовка.
+SNIFF_LIMIT = 256 * 1024
+
+
+class ImageUploadError(MultiPartParserError):
+    pass
+
+
+def check_upload_size(size):
+    if size and size > settings.MAX_IMAGE_UPLOAD_SIZE:
+        raise ImageUploadError(
+            f'Image is larger than {settings.MAX_IMAGE_UPLOAD_SIZE} bytes.'
+        )
+
+
+class ImageSniffer:
+    """
+    Проверяет загружаемое изображение по мере поступления данных.
+
+    Размеры читаются из заголовка файла без декодирования пикселей,
+    поэтому слишком большое или не похожее на картинку тело
+    отклоняется до того, как будет прочитано целиком.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.head = b''
+        self.checked = False
+
+    def feed(self, chunk):
+        self.size += len(chunk)
+        check_upload_size(self.size)
+        if self.checked:
+            return
+        self.head += chunk
+        try:
+            width, height = Image.open(BytesIO(self.head)).size
+        except Image.DecompressionBombError:
+            width = height = None
+        except (OSError, EOFError):
+            if len(self.head) >= SNIFF_LIMIT:
+                raise ImageUploadError('Upload a valid image.')
+            return
+        if width is None or (
+                max(width, height) > settings.MAX_IMAGE_DIMENSION):
+            raise ImageUploadError(
+                f'Image sides must not exceed '
+                f'{settings.MAX_IMAGE_DIMENSION} pixels.'
+            )
+        self.checked = True
+        self.head = b''
+
+    def finish(self):
+        if not self.checked:
+            raise ImageUploadError('Upload a valid image.')
+
+
+def new_upload_file(extension, content_type):
+    """Файл в памяти, после FILE_UPLOAD_MAX_MEMORY_SIZE байт — на диске."""
+    file = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE,
+        dir=settings.FILE_UPLOAD_TEMP_DIR,
+    )
+    return UploadedFile(file=file,
+                        name=f'{uuid.uuid4()}.{extension}',
+                        content_type=content_type,
+                        size=0)
+
+
+def read_image(chunks, extension, content_type):
+    """Пишет куски изображения во временный файл, проверяя их на лету."""
+    sniffer = ImageSniffer()
+    file = new_upload_file(extension, content_type)
+    for chunk in chunks:
+        sniffer.feed(chunk)
+        file.write(chunk)
+    sniffer.finish()
+    file.size = sniffer.size
+    file.seek(0)
+    return file
+
+
+def decode_base64_image(data):
+    """Декодирует data:image/...;base64 по кускам во временный файл."""
+    if ';base64,' not in data:
+        raise ImageUploadError('Invalid base64 data.')
+    header, encoded = data.split(';base64,', 1)
+    content_type = header[len('data:'):]
+    # Переносы строк сдвигают группы по 4 символа между кусками.
+    encoded = ''.join(encoded.split())
+    check_upload_size(len(encoded.rstrip('=')) * 3 // 4)
+    try:
+        return read_image(
+            (
+                b64decode(encoded[start:start + CHUNK_SIZE])
+                for start in range(0, len(encoded), CHUNK_SIZE)
+            ),
+            content_type.split('/')[-1],
+            content_type,
+        )
+    except binascii.Error:
+        raise ImageUploadError('Invalid base64 data.')
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Проверяет файлы multipart-запроса по первым кускам и передаёт
+    данные дальше стандартным обработчикам Django, которые сохраняют
+    большие файлы во временные файлы на диске.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sniffer = ImageSniffer()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sniffer.feed(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.sniffer.finish()
+
+
+class RawImageParser(BaseParser):
+    """
+    Принимает изображение телом запроса (Content-Type: image/*).
+
+    Файл попадает в поле upload_field представления.
+    """
+    media_type = 'image/*'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        view = parser_context['view']
+        content_type = media_type.split(';')[0].strip()
+        try:
+            check_upload_size(int(request.META.get('CONTENT_LENGTH') or 0))
+            if stream is None:
+                raise ImageUploadError('Empty request body.')
+            file = read_image(
+                iter(lambda: stream.read(CHUNK_SIZE), b''),
+                content_type.split('/')[-1],
+                content_type,
+            )
+        except ImageUploadError as error:
+            raise ParseError(str(error))
+        return DataAndFiles({}, {view.upload_field: file})
+
+
+def normalize_form_data(data, list_fields=(), json_fields=()):
+    """
+    Превращает данные multipart-формы в обычный словарь: поля из
+    list_fields становятся списками, поля из json_fields можно
+    передать JSON-строкой.
+    """
+    if not isinstance(data, QueryDict):
+        return data
+    result = {}
+    for key in data:
+        values = data.getlist(key)
+        if key in json_fields and len(values) == 1:
+            try:
+                value = json.loads(values[0])
+            except (TypeError, ValueError):
+                value = None
+            # Одно значение списка (tags=2) тоже разбирается как JSON,
+            # но списком от этого не становится.
+            if isinstance(value, (list, dict)):
+                result[key] = value
+                continue
+        result[key] = values if key in list_fields else values[-1]
+    return result
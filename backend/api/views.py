@@ -1,30 +1,41 @@
 from urllib.parse import urljoin
 
 from django.contrib.auth import get_user_model
-from django.http import FileResponse
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
+from django.http import FileResponse, Http404
 from django.shortcuts import redirect
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, permissions, status, viewsets
+from rest_framework import permissions, serializers, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import (RetrieveUpdateDestroyAPIView,
                                      ValidationError, get_object_or_404)
 from rest_framework.mixins import (CreateModelMixin, DestroyModelMixin,
                                    ListModelMixin)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 
 from foodgram.models import (FavoriteRecipe, Ingredient, Recipe, ShoppingCart,
                              Subscription, Tag)
 
-from .filters import RecipeFilterSet
+from .cache import CATALOG, instance_tag, model_tag
+from .filters import RecipeFilterSet, RecipeOrderingFilter
+from .ingredient_index import ingredient_index
+from .mixins import (AnonymousCacheMixin, CatalogCacheMixin,
+                     ImageUploadMixin, KeysetPaginationMixin)
 from .pagination import LimitPagination
 from .permission import IsAuthenticatedOrAuthorOrReadOnly
-from .serializers import (AvatarSerializer, FavoriteSerializer,
+from .renderers import CSVRenderer, ORJSONRenderer, PDFRenderer, TxtRenderer
+from .search import RecipeSearchFilter
+from .serializers import (SMALL_IMAGE, AvatarSerializer, FavoriteSerializer,
                           GetOrRetriveIngredientSerializer,
                           RecipeLinkSerializer, RecipeListOrRetrieveSerializer,
                           RecipePostOrPatchSerializer, ShoppingCartSerializer,
                           SubList, SubscriptionSerializer, TagSerializer)
+from .shopping_cart import SHOPPING_LIST_FORMATS, get_shopping_list_file
+from .short_links import short_link_cache
 
 User = get_user_model()
 
@@ -66,8 +77,9 @@ class BaseRecipeFavorAndShoppingView(CreateModelMixin,
             )
 
 
-class UserAvatarUpdateView(RetrieveUpdateDestroyAPIView):
+class UserAvatarUpdateView(ImageUploadMixin, RetrieveUpdateDestroyAPIView):
     serializer_class = AvatarSerializer
+    upload_field = 'avatar'
 
     def get_object(self):
         return self.request.user
@@ -94,12 +106,40 @@ class UserAvatarUpdateView(RetrieveUpdateDestroyAPIView):
             return Response(e, status=status.HTTP_400_BAD_REQUEST)
 
 
-class SubscriptionViewSet(viewsets.GenericViewSet, ListModelMixin):
+class SubscriptionViewSet(KeysetPaginationMixin,
+                          viewsets.GenericViewSet,
+                          ListModelMixin):
     pagination_class = LimitPagination
+    keyset_ordering = ('-id',)
+
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get("recipes_limit")
+        if recipes_limit is None:
+            return None
+        if not recipes_limit.isnumeric():
+            raise serializers.ValidationError(
+                {"recipes_limit": "Invalid recipes_limit parameter."}
+            )
+        return int(recipes_limit)
 
     def get_queryset(self):
         user = self.request.user
-        return Subscription.objects.filter(user=user)
+        recipes = Recipe.objects.all()
+        recipes_limit = self.get_recipes_limit()
+        if recipes_limit is not None:
+            recipes = recipes.annotate(row_number=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=Recipe._meta.ordering,
+            )).filter(row_number__lte=recipes_limit)
+        return (
+            Subscription.objects.filter(user=user)
+            .select_related('subscribed_to')
+            .prefetch_related(Prefetch('subscribed_to__recipes',
+                                       queryset=recipes,
+                                       to_attr='recipes_preview'))
+            .order_by('-id')
+        )
 
     @action(detail=False,
             methods=['get'],
@@ -130,8 +170,10 @@ class SubscriptionViewSet(viewsets.GenericViewSet, ListModelMixin):
         serializer.is_valid(raise_exception=True)
 
         try:
-            serializer.save()
-            return Response(serializer.data,
+            subscription = serializer.save()
+            subscription = self.get_queryset().get(pk=subscription.pk)
+            return Response(SubList(subscription,
+                                    context={'request': request}).data,
                             status=status.HTTP_201_CREATED)
         except ValidationError as e:
             return Response({"errors": str(e)},
@@ -159,8 +201,8 @@ class RecipeLinkView(APIView):
         try:
             recipe = Recipe.objects.get(pk=id)
             if not recipe.short_url:
-                recipe.short_url = Recipe.generate_short_url()
-                recipe.save()
+                recipe.short_url = Recipe.generate_short_url(recipe.pk)
+                recipe.save(update_fields=['short_url'])
             serializer = RecipeLinkSerializer(recipe,
                                               context={'request': request})
             return Response(serializer.data, status=status.HTTP_200_OK)
@@ -172,23 +214,30 @@ class RecipeLinkView(APIView):
 
 
 def redirect_to_original(request, short_code):
-    url = get_object_or_404(Recipe, short_url=short_code)
+    recipe_id = short_link_cache.resolve(short_code)
+    if recipe_id is None:
+        raise Http404('Recipe not found.')
     domain = request.get_host()
-    target_url = urljoin(f"http://{domain}/", f"recipes/{url.id}")
+    target_url = urljoin(f"http://{domain}/", f"recipes/{recipe_id}")
 
     return redirect(target_url)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = GetOrRetriveIngredientSerializer
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['^name']
+    filter_backends = []
     pagination_class = None
     permission_classes = [permissions.AllowAny]
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(api_settings.SEARCH_PARAM)
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
@@ -205,12 +254,61 @@ class ShoppingCartView(BaseRecipeFavorAndShoppingView):
     serializer_class = ShoppingCartSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(KeysetPaginationMixin,
+                    ImageUploadMixin,
+                    AnonymousCacheMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, RecipeSearchFilter,
+                       RecipeOrderingFilter]
     filterset_class = RecipeFilterSet
     pagination_class = LimitPagination
+    count_estimate = True
     permission_classes = [IsAuthenticatedOrAuthorOrReadOnly, ]
+    form_list_fields = ('tags',)
+    form_json_fields = ('tags', 'ingredients')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ['list', 'retrieve']:
+            return queryset
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(FavoriteRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+            )
+        else:
+            queryset = queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        # Автор, теги и ингредиенты загружаются сериализатором только
+        # для рецептов, которых нет в кэше.
+        return queryset
+
+    def get_cache_tags(self):
+        if self.action == 'retrieve':
+            return [instance_tag(Recipe, self.kwargs['pk']), CATALOG]
+        return [model_tag(Recipe), CATALOG]
+
+    def get_response_cache_tags(self, data):
+        recipes = [data] if self.action == 'retrieve' else data['results']
+        return [instance_tag(User, recipe['author']['id'])
+                for recipe in recipes]
+
+    @property
+    def keyset_ordering(self):
+        return (RecipeOrderingFilter.get_ordering(self.request)
+                or Recipe._meta.ordering)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'list':
+            context['image_variant'] = SMALL_IMAGE
+        return context
 
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
@@ -226,29 +324,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
         self.perform_update(serializer)
         return Response(serializer.data)
 
-    @action(detail=False, methods=['get'], url_path='download_shopping_cart')
+    @action(detail=False, methods=['get'], url_path='download_shopping_cart',
+            permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=[ORJSONRenderer, TxtRenderer, CSVRenderer,
+                              PDFRenderer])
     def download_shopping_cart(self, request, *args, **kwargs):
-        user = request.user
-        shopping_cart = ShoppingCart.objects.filter(user=user)
-        ingredients = {}
-        for item in shopping_cart:
-            recipe = item.recipe
-            for ingredient in recipe.ingredients.all():
-                name = ingredient.ingredient.name
-                amount = ingredient.amount
-                unit = ingredient.ingredient.unit
-
-                if name in ingredients:
-                    ingredients[name]['amount'] += amount
-                else:
-                    ingredients[name] = {'amount': amount, 'unit': unit}
-
-        content = "Shopping Cart Ingredients:\n\n"
-        for name, details in ingredients.items():
-            content += f"{name}: {details['amount']} {details['unit']}\n"
-
-        response = FileResponse(content, content_type='text/plain')
-        response[
-            'Content-Disposition'
-        ] = 'attachment; filename="shopping_cart.txt"'
-        return response
+        file_format = request.accepted_renderer.format
+        if file_format not in SHOPPING_LIST_FORMATS:
+            file_format = 'txt'
+        content_type, _ = SHOPPING_LIST_FORMATS[file_format]
+        return FileResponse(
+            open(get_shopping_list_file(request.user, file_format), 'rb'),
+            as_attachment=True,
+            filename=f'shopping_cart.{file_format}',
+            content_type=content_type,
+        )
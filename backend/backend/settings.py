@@ -35,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,6 +84,15 @@ else:
         }
     }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -112,6 +122,41 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+SHOPPING_LIST_CACHE_DIR = BASE_DIR / 'shopping_lists'
+SHOPPING_LIST_CACHE_MAX_AGE = 24 * 60 * 60
+SHOPPING_LIST_LOCK_TIMEOUT = 60
+SHOPPING_LIST_WAIT = 10
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+INGREDIENT_INDEX_TTL = 10 * 60
+CATALOG_CACHE_TIMEOUT = 24 * 60 * 60
+SHORT_LINK_CACHE_SIZE = 10000
+SHORT_LINK_NEGATIVE_TTL = 60
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', 2))
+IMAGE_PIPELINE_ASYNC = True
+MAX_IMAGE_UPLOAD_SIZE = 20 * 1024 * 1024
+MAX_IMAGE_DIMENSION = 10000
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+PAGINATION_COUNT_ESTIMATE_MIN = 100000
+TRENDING_HALF_LIFE = 2 * 24 * 60 * 60
+ANONYMOUS_CACHE_TIMEOUT = 5 * 60
+ANONYMOUS_CACHE_LOCK_TIMEOUT = 30
+ANONYMOUS_CACHE_WAIT = 1
+RECIPE_BODY_CACHE_TIMEOUT = 24 * 60 * 60
+# События моложе этого (секунды) ждут следующего прохода update_trending,
+# чтобы не пропустить ещё не закоммиченные строки с меньшими id.
+TRENDING_COMMIT_LAG = 10
+# Запросы дольше этого (мс) попадают в лог api.instrumentation
+# вместе с SLOW_REQUEST_TOP_QUERIES самыми долгими SQL-запросами.
+SLOW_REQUEST_THRESHOLD = int(os.getenv('SLOW_REQUEST_THRESHOLD', 500))
+SLOW_REQUEST_TOP_QUERIES = 5
+METRICS_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'foodgram.User'
@@ -127,6 +172,15 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'SEARCH_PARAM': 'name',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
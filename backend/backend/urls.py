@@ -3,6 +3,7 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from api.instrumentation import metrics_view
 from api.views import redirect_to_original
 
 urlpatterns = [
@@ -11,6 +12,9 @@ urlpatterns = [
     path('s/<str:short_code>/',
          redirect_to_original,
          name='short_link_redirect'),
+    # nginx не проксирует /internal/: адрес доступен только
+    # внутри сети контейнеров, например для Prometheus.
+    path('internal/metrics/', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
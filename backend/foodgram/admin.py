@@ -1,12 +1,12 @@
 from django import forms
 from django.contrib import admin
 from django.core.exceptions import ValidationError
-from django.db.models import Count
 from django.forms.models import BaseInlineFormSet
 from django.utils.html import format_html
 
 from .models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
                      ShoppingCart, Subscription, Tag, User)
+from .signals import recipe_related_saved
 
 
 @admin.register(User)
@@ -86,15 +86,15 @@ class RecipeAdmin(admin.ModelAdmin):
     filter_horizontal = ('tags',)
     inlines = [RecipeIngredientInline]
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        qs = qs.annotate(_times_favorited=Count('favorited_by'))
-        return qs
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        recipe_related_saved.send(sender=Recipe, instance=form.instance)
 
     def times_favorited(self, obj):
-        return obj._times_favorited
+        return obj.favorites_count
 
     times_favorited.short_description = 'Times Favorited'
+    times_favorited.admin_order_field = 'favorites_count'
 
 
 @admin.register(Tag)
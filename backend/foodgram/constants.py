@@ -1,4 +1,5 @@
 import string
+from datetime import datetime, timezone
 
 # Константы
 MAX_LENGTH_NAME = 150
@@ -12,10 +13,24 @@ TAG_ALLOW_PATTERN = r'[a-zA-Zа-яА-ЯёЁ\s\-]'
 NAME_RECIPE_PATTERN = r'[a-zA-Zа-яА-ЯёЁ\s\-\(\)]'
 ERROR_MESSAGE = 'The field contains invalid characters.'
 
-MAX_ATTEMPTS = 20
 MAX_LENGTH_TITLE = 255
 MAX_LENGTH_TAG = 100
 MAX_LENGTH_UNIT = 50
 MAX_LENGTH_AMOUNT = 10
 MAX_LENGTH_SHORT_URL = 6
 CHAR_SELECT = string.digits + string.ascii_letters
+# Простое число около 0.618 * 62 ** MAX_LENGTH_SHORT_URL, взаимно простое
+# с ним: умножение переставляет коды и скрывает порядок id.
+SHORT_URL_MULTIPLIER = 35104476161
+SHORT_URL_OFFSET = 916132832
+IMAGE_VARIANT_SIZES = {
+    'small': (320, 320),
+    'medium': (800, 800),
+}
+# Точка отсчёта времени для Recipe.trending_score.
+TRENDING_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# Вес событий в рейтинге популярности.
+TRENDING_WEIGHTS = {
+    'favorites': 1.0,
+    'carts': 1.0,
+}
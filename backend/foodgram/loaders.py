@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from itertools import islice
+from pathlib import Path
+
+from django.db import connection, transaction
+
+
+def read_rows(path, fields, json_fields=None):
+    """
+    Построчно читает CSV без заголовка или JSON-список объектов.
+
+    Возвращает кортежи значений в порядке fields; строки другой длины
+    возвращаются как есть, чтобы загрузчик посчитал их ошибочными.
+    """
+    json_fields = json_fields or fields
+    with open(path, encoding='utf-8') as file:
+        if Path(path).suffix.lower() == '.json':
+            for item in json.load(file):
+                yield tuple(
+                    str(item.get(field, '')).strip() for field in json_fields
+                )
+            return
+        for row in csv.reader(file):
+            row = tuple(value.strip() for value in row)
+            if row != tuple(fields):
+                yield row
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def copy_rows(model, fields, batches):
+    """COPY во временную таблицу и INSERT ... ON CONFLICT DO NOTHING."""
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(
+        connection.ops.quote_name(model._meta.get_field(field).column)
+        for field in fields
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE catalog_staging ON COMMIT DROP AS '
+            f'SELECT {columns} FROM {table} WITH NO DATA'
+        )
+        for batch in batches:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(
+                f'COPY catalog_staging ({columns}) FROM STDIN '
+                f'WITH (FORMAT csv)',
+                buffer
+            )
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) '
+            f'SELECT DISTINCT {columns} FROM catalog_staging '
+            f'ON CONFLICT DO NOTHING'
+        )
+        return cursor.rowcount
+
+
+def bulk_load(model, fields, rows, batch_size):
+    """
+    Загружает строки пачками, пропуская уже существующие записи.
+
+    Возвращает (прочитано, добавлено, ошибочных строк).
+    """
+    stats = {'read': 0, 'invalid': 0}
+
+    def valid_rows():
+        for row in rows:
+            if len(row) != len(fields) or not all(row):
+                stats['invalid'] += 1
+                continue
+            stats['read'] += 1
+            yield row
+
+    batches = batched(valid_rows(), batch_size)
+    if connection.vendor == 'postgresql':
+        created = copy_rows(model, fields, batches)
+    else:
+        before = model.objects.count()
+        with transaction.atomic():
+            for batch in batches:
+                model.objects.bulk_create(
+                    [model(**dict(zip(fields, row))) for row in batch],
+                    ignore_conflicts=True,
+                )
+        created = model.objects.count() - before
+    return stats['read'], created, stats['invalid']
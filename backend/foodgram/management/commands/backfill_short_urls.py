@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from foodgram.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Assigns deterministic short URLs to recipes in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=1000,
+                            help='Number of recipes updated per query'
+                            )
+        parser.add_argument('--all',
+                            action='store_true',
+                            help='Regenerate codes that are already set'
+                            )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        recipes = Recipe.objects.order_by('pk').only('pk', 'short_url')
+        if not kwargs['all']:
+            recipes = recipes.filter(short_url=None)
+        last_pk = 0
+        updated = 0
+        while True:
+            batch = list(recipes.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            for recipe in batch:
+                recipe.short_url = Recipe.generate_short_url(recipe.pk)
+            Recipe.objects.bulk_update(batch, ['short_url'])
+            updated += len(batch)
+            last_pk = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(
+            f"Short URLs assigned: {updated}")
+        )
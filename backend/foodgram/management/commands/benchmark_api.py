@@ -0,0 +1,85 @@
+import json
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from api.benchmark import ENDPOINTS, cleanup, get_context, run
+from foodgram.models import (FavoriteRecipe, Recipe, ShoppingCart,
+                             Subscription, User)
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Measures latency and SQL queries of API endpoints '
+            'on the synthetic dataset and prints a JSON report')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations',
+                            type=int,
+                            default=50,
+                            help='Measured requests per endpoint'
+                            )
+        parser.add_argument('--warmup',
+                            type=int,
+                            default=1,
+                            help='Unmeasured requests per endpoint'
+                            )
+        parser.add_argument('--endpoint',
+                            action='append',
+                            help='Only endpoints whose name contains '
+                                 'this text; can be repeated'
+                            )
+        parser.add_argument('--output',
+                            type=str,
+                            help='Write the report to this file'
+                            )
+
+    def handle(self, *args, **kwargs):
+        context = get_context()
+        if context is None:
+            raise CommandError('No synthetic data, run seed_synthetic first')
+        endpoints = [
+            endpoint for endpoint in ENDPOINTS
+            if not kwargs['endpoint']
+            or any(text in endpoint.name for text in kwargs['endpoint'])
+        ]
+        # Тестовый клиент ходит на testserver.
+        allowed_hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        try:
+            with override_settings(ALLOWED_HOSTS=allowed_hosts):
+                results = run(
+                    endpoints, context, kwargs['iterations'],
+                    kwargs['warmup']
+                )
+        finally:
+            cleanup()
+        report = json.dumps({
+            'commit': get_commit(),
+            'date': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'iterations': kwargs['iterations'],
+            'dataset': {
+                model._meta.model_name: model.objects.count()
+                for model in (User, Recipe, FavoriteRecipe, ShoppingCart,
+                              Subscription)
+            },
+            'endpoints': results,
+        }, ensure_ascii=False, indent=2)
+        if kwargs['output']:
+            with open(kwargs['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,98 @@
+import os
+import timeit
+from base64 import b64encode
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer, orjson
+from api.serializers import GetOrRetriveIngredientSerializer
+from foodgram.loaders import read_rows
+from foodgram.models import Ingredient, Tag
+
+
+class Command(BaseCommand):
+    help = 'Compares stdlib json and orjson on API payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients-file',
+                            type=str,
+                            help='CSV or JSON file used when the database '
+                                 'has no ingredients'
+                            )
+        parser.add_argument('--image-size',
+                            type=int,
+                            default=1024,
+                            help='Side of the image sent in a recipe body'
+                            )
+        parser.add_argument('--number',
+                            type=int,
+                            default=20,
+                            help='Runs per measurement'
+                            )
+
+    def get_ingredients(self, path):
+        ingredients = Ingredient.objects.order_by('name')
+        if ingredients.exists() or not path:
+            return GetOrRetriveIngredientSerializer(
+                ingredients, many=True
+            ).data
+        return [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for pk, (name, unit) in enumerate(read_rows(
+                path,
+                fields=('name', 'unit'),
+                json_fields=('name', 'measurement_unit')
+            ), start=1)
+        ]
+
+    def get_recipe_body(self, size):
+        image = Image.frombytes(
+            'RGB', (size, size), os.urandom(size * size * 3)
+        )
+        buffer = BytesIO()
+        image.save(buffer, format='PNG')
+        return {
+            'name': 'Борщ с пампушками',
+            'text': 'Сварить бульон, добавить свёклу и капусту. ' * 20,
+            'cooking_time': 90,
+            'tags': list(Tag.objects.values_list('pk', flat=True)) or [1],
+            'ingredients': [
+                {'id': pk, 'amount': 100 + pk} for pk in range(1, 16)
+            ],
+            'image': 'data:image/png;base64,'
+                     + b64encode(buffer.getvalue()).decode(),
+        }
+
+    def measure(self, func, number):
+        return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+    def handle(self, *args, **kwargs):
+        if orjson is None:
+            self.stderr.write('orjson is not installed, '
+                              'both columns use stdlib json')
+        number = kwargs['number']
+        payloads = {
+            'ingredients': self.get_ingredients(kwargs['ingredients_file']),
+            'recipe create': self.get_recipe_body(kwargs['image_size']),
+        }
+        pairs = (
+            ('stdlib', JSONRenderer(), JSONParser()),
+            ('orjson', ORJSONRenderer(), ORJSONParser()),
+        )
+        for name, data in payloads.items():
+            content = JSONRenderer().render(data)
+            self.stdout.write(f'{name}: {len(content) / 1024:.0f} KiB')
+            for label, renderer, parser in pairs:
+                render = self.measure(lambda: renderer.render(data), number)
+                parse = self.measure(
+                    lambda: parser.parse(BytesIO(content)), number
+                )
+                self.stdout.write(
+                    f'  {label}: render {render * 1000:.2f} ms, '
+                    f'parse {parse * 1000:.2f} ms'
+                )
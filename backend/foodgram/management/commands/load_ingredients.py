@@ -1,42 +1,37 @@
-import csv
+import time
 
 from django.core.management.base import BaseCommand
 
+from api.cache import CATALOG, bump_version
+from foodgram.loaders import bulk_load, read_rows
 from foodgram.models import Ingredient
 
 
 class Command(BaseCommand):
-    help = 'Loads ingredients from a CSV file'
+    help = 'Loads ingredients from a CSV or JSON file'
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file',
                             type=str,
-                            help='The path to the CSV file'
+                            help='The path to the CSV or JSON file'
+                            )
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=1000,
+                            help='Number of rows inserted per query'
                             )
 
     def handle(self, *args, **kwargs):
-        csv_file = kwargs['csv_file']
-
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                if len(row) == 2:
-                    name, unit = row
-                    name = name.strip()
-                    unit = unit.strip()
-
-                    ingredient, created = Ingredient.objects.get_or_create(
-                        name=name, unit=unit
-                    )
-                    if created:
-                        self.stdout.write(self.style.SUCCESS(
-                            f"Added: {name} ({unit})")
-                        )
-                    else:
-                        self.stdout.write(self.style.WARNING(
-                            f"Skipped (already exists): {name} ({unit})")
-                        )
-                else:
-                    self.stdout.write(self.style.ERROR(
-                        f"Skipped (invalid format): {row}")
-                    )
+        started = time.monotonic()
+        rows = read_rows(kwargs['csv_file'],
+                         fields=('name', 'unit'),
+                         json_fields=('name', 'measurement_unit'))
+        read, created, invalid = bulk_load(
+            Ingredient, ('name', 'unit'), rows, kwargs['batch_size']
+        )
+        bump_version(CATALOG)
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingredients: {read} read, {created} added, "
+            f"{read - created} skipped as duplicates, {invalid} invalid "
+            f"({time.monotonic() - started:.2f}s)")
+        )
@@ -1,33 +1,33 @@
-import csv
+import time
 
 from django.core.management.base import BaseCommand
 
+from api.cache import CATALOG, bump_version
+from foodgram.loaders import bulk_load, read_rows
 from foodgram.models import Tag
 
 
 class Command(BaseCommand):
-    help = 'Loads tags from a CSV file'
+    help = 'Loads tags from a CSV or JSON file'
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file',
-                            type=str, help='The path to the CSV file')
+                            type=str, help='The path to the CSV or JSON file')
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=1000,
+                            help='Number of rows inserted per query'
+                            )
 
     def handle(self, *args, **kwargs):
-        csv_file = kwargs['csv_file']
-
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                name = row['name'].strip()
-                slug = row['slug'].strip()
-
-                tag, created = Tag.objects.get_or_create(name=name,
-                                                         slug=slug)
-                if created:
-                    self.stdout.write(self.style.SUCCESS(
-                        f"Added: {name} ({slug})")
-                    )
-                else:
-                    self.stdout.write(self.style.WARNING(
-                        f"Skipped (already exists): {name} ({slug})")
-                    )
+        started = time.monotonic()
+        rows = read_rows(kwargs['csv_file'], fields=('name', 'slug'))
+        read, created, invalid = bulk_load(
+            Tag, ('name', 'slug'), rows, kwargs['batch_size']
+        )
+        bump_version(CATALOG)
+        self.stdout.write(self.style.SUCCESS(
+            f"Tags: {read} read, {created} added, "
+            f"{read - created} skipped as duplicates, {invalid} invalid "
+            f"({time.monotonic() - started:.2f}s)")
+        )
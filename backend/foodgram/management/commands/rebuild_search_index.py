@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from api.search import create_search_index, index_recipes
+from foodgram.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of recipes in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=1000,
+                            help='Number of recipes indexed per query'
+                            )
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        create_search_index()
+        pks = Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        last_pk = 0
+        indexed = 0
+        while True:
+            batch = list(pks.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            index_recipes(batch)
+            indexed += len(batch)
+            last_pk = batch[-1]
+        self.stdout.write(self.style.SUCCESS(
+            f"Recipes indexed: {indexed}")
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.counters import COUNTERS, reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recounts denormalized favorite, cart and recipe counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=1000,
+                            help='Number of objects checked per query'
+                            )
+
+    def handle(self, *args, **kwargs):
+        for model in COUNTERS:
+            fixed = reconcile_counters(model, kwargs['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{model._meta.verbose_name_plural}: fixed {fixed}")
+            )
@@ -0,0 +1,97 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import CATALOG, COUNTS, bump_version, model_tag
+from foodgram.models import Recipe, User
+from foodgram.synthetic import seed_dataset, synthetic_users
+
+
+class Command(BaseCommand):
+    help = 'Fills the database with a deterministic synthetic dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users',
+                            type=int,
+                            default=1000,
+                            help='Number of users'
+                            )
+        parser.add_argument('--recipes',
+                            type=int,
+                            default=10000,
+                            help='Number of recipes'
+                            )
+        parser.add_argument('--ingredients-per-recipe',
+                            type=int,
+                            default=8,
+                            help='Ingredient lines in every recipe'
+                            )
+        parser.add_argument('--favorites',
+                            type=int,
+                            default=20,
+                            help='Average favorites per user'
+                            )
+        parser.add_argument('--carts',
+                            type=int,
+                            default=5,
+                            help='Average shopping cart items per user'
+                            )
+        parser.add_argument('--subscriptions',
+                            type=int,
+                            default=10,
+                            help='Average subscriptions per user'
+                            )
+        parser.add_argument('--ingredients',
+                            type=int,
+                            default=500,
+                            help='Ingredients created when the catalogue '
+                                 'is empty'
+                            )
+        parser.add_argument('--seed',
+                            type=int,
+                            default=0,
+                            help='Random seed'
+                            )
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=1000,
+                            help='Number of rows inserted per query'
+                            )
+        parser.add_argument('--flush',
+                            action='store_true',
+                            help='Delete the previous synthetic dataset first'
+                            )
+
+    def handle(self, *args, **kwargs):
+        started = time.monotonic()
+        batch_size = kwargs['batch_size']
+        if kwargs['flush']:
+            synthetic_users().delete()
+        elif synthetic_users().exists():
+            raise CommandError(
+                'Synthetic data already exists, run with --flush'
+            )
+        created = seed_dataset(
+            users=kwargs['users'],
+            recipes=kwargs['recipes'],
+            ingredients_per_recipe=kwargs['ingredients_per_recipe'],
+            favorites=kwargs['favorites'],
+            carts=kwargs['carts'],
+            subscriptions=kwargs['subscriptions'],
+            ingredients=kwargs['ingredients'],
+            seed=kwargs['seed'],
+            batch_size=batch_size,
+        )
+        for model, count in created.items():
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {count}")
+        # bulk_create не отправляет сигналы: короткие ссылки, поиск,
+        # счётчики и версии кэша обновляются здесь.
+        for command in ('backfill_short_urls', 'rebuild_search_index',
+                        'reconcile_counters'):
+            call_command(command, batch_size=batch_size, stdout=self.stdout)
+        for name in (CATALOG, COUNTS, model_tag(Recipe), model_tag(User)):
+            bump_version(name)
+        self.stdout.write(self.style.SUCCESS(
+            f"Synthetic dataset created ({time.monotonic() - started:.2f}s)")
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.trending import update_trending
+
+
+class Command(BaseCommand):
+    help = ('Adds new favorites and cart additions to recipe trending '
+            'scores; run it periodically, e.g. from cron every 5 minutes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=1000,
+                            help='Number of events processed per transaction'
+                            )
+
+    def handle(self, *args, **kwargs):
+        processed = update_trending(kwargs['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Events processed: {processed}")
+        )
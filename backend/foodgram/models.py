@@ -1,17 +1,17 @@
-from random import choices
-
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import RegexValidator
 from django.db import models
-from django.db.models import CheckConstraint, Q, UniqueConstraint
+from django.db.models import CheckConstraint, F, Q, UniqueConstraint
 from django.utils.html import format_html
 
-from .constants import (CHAR_SELECT, ERROR_MESSAGE, MAX_ATTEMPTS,
-                        MAX_LENGTH_EMAIL, MAX_LENGTH_NAME,
-                        MAX_LENGTH_SHORT_URL, MAX_LENGTH_TAG, MAX_LENGTH_UNIT,
-                        NAME_RECIPE_PATTERN, NAMES_ALLOW_PATTERN,
-                        TAG_ALLOW_PATTERN, USERNAME_RESTRICT_PATTERN)
+from .constants import (CHAR_SELECT, ERROR_MESSAGE, MAX_LENGTH_EMAIL,
+                        MAX_LENGTH_NAME, MAX_LENGTH_SHORT_URL, MAX_LENGTH_TAG,
+                        MAX_LENGTH_UNIT, NAME_RECIPE_PATTERN,
+                        NAMES_ALLOW_PATTERN, SHORT_URL_MULTIPLIER,
+                        SHORT_URL_OFFSET, TAG_ALLOW_PATTERN,
+                        USERNAME_RESTRICT_PATTERN)
 
 
 class User(AbstractUser):
@@ -67,6 +67,23 @@ class User(AbstractUser):
         default=None,
         help_text='Загрузите фото профиля.'
     )
+    avatar_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии фото профиля',
+    )
+    # Счётчики поддерживаются при записи, сверяются reconcile_counters.
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число рецептов',
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число подписчиков',
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -167,6 +184,11 @@ class Ingredient(models.Model):
                 name='unique_ingredients'
             ),
         ]
+        indexes = [
+            # Поиск по началу названия (LIKE 'мук%') в PostgreSQL.
+            models.Index(fields=['name'], name='ingredient_name_prefix_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -198,6 +220,12 @@ class Recipe(models.Model):
         verbose_name='Изображение рецепта',
         help_text='Загрузите изображение для рецепта.'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения',
+    )
     text = models.TextField(
         verbose_name='Описание рецепта',
         help_text='Введите полное описание рецепта.'
@@ -221,9 +249,34 @@ class Recipe(models.Model):
         max_length=MAX_LENGTH_SHORT_URL,
         verbose_name='Короткий URL',
         help_text='Короткий URL для рецепта.',
+        unique=True,
         blank=True,
         null=True,
     )
+    # Заполняется api.search.index_recipes; GIN-индекс по полю
+    # создаётся после migrate, в SQLite вместо него таблица FTS5.
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах',
+    )
+    # log2 суммы вкладов избранного и корзин, растущих вдвое за каждый
+    # TRENDING_HALF_LIFE: порядок по нему — порядок по затухающей сумме.
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Рейтинг популярности',
+    )
 
     class Meta:
         constraints = [
@@ -232,16 +285,51 @@ class Recipe(models.Model):
                 name='unique_author_name_recipe'
             ),
         ]
+        indexes = [
+            models.Index(fields=['-date_created', '-id'],
+                         name='recipe_feed_idx'),
+            models.Index(F('favorites_count') + F('carts_count'), F('id'),
+                         name='recipe_popular_idx'),
+            models.Index(fields=['-trending_score', '-id'],
+                         name='recipe_trending_idx'),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ['-date_created']
+        ordering = ['-date_created', '-id']
 
     @staticmethod
-    def generate_short_url():
-        for _ in range(MAX_ATTEMPTS):
-            short = ''.join(choices(CHAR_SELECT, k=MAX_LENGTH_SHORT_URL))
-            if not Recipe.objects.filter(short_url=short).exists():
-                return short
+    def generate_short_url(pk):
+        """
+        Взаимно однозначно переводит id рецепта в код base62.
+
+        Аффинное преобразование по модулю 62 ** 6, разворот цифр и
+        повторное преобразование: соседние id дают непохожие коды.
+        """
+        base = len(CHAR_SELECT)
+        size = base ** MAX_LENGTH_SHORT_URL
+        value = (pk * SHORT_URL_MULTIPLIER + SHORT_URL_OFFSET) % size
+        reversed_value = 0
+        for _ in range(MAX_LENGTH_SHORT_URL):
+            value, digit = divmod(value, base)
+            reversed_value = reversed_value * base + digit
+        value = (
+            (reversed_value * SHORT_URL_MULTIPLIER + SHORT_URL_OFFSET) % size
+        )
+        code = []
+        for _ in range(MAX_LENGTH_SHORT_URL):
+            value, digit = divmod(value, base)
+            code.append(CHAR_SELECT[digit])
+        return ''.join(reversed(code))
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if not self.short_url:
+            # Код зависит от id, поэтому пишется после INSERT, но
+            # UPDATE без save(): post_save срабатывает один раз.
+            self.short_url = self.generate_short_url(self.pk)
+            Recipe.objects.filter(pk=self.pk).update(
+                short_url=self.short_url
+            )
 
     def image_display(self):
         if self.image:
@@ -319,16 +407,19 @@ class FavoriteRecipe(AddRecipeAbstractModel):
         help_text='Рецепт, который был добавлен в избранное.'
     )
 
-
-class Meta:
-    constraints = [
-        UniqueConstraint(
-            fields=['user', 'recipe'],
-            name='unique_favorite_recipes'
-        ),
-    ]
-    verbose_name = 'Избранный рецепт'
-    verbose_name_plural = 'Избранные рецепты'
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_favorite_recipes'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-added_at'],
+                         name='favorite_user_added_idx'),
+        ]
+        verbose_name = 'Избранный рецепт'
+        verbose_name_plural = 'Избранные рецепты'
 
 
 class ShoppingCart(AddRecipeAbstractModel):
@@ -359,3 +450,60 @@ class ShoppingCart(AddRecipeAbstractModel):
 
     def __str__(self):
         return f'{self.user.username} -> {self.recipe.name}'
+
+
+class TrendingCheckpoint(models.Model):
+    """Последнее событие источника, учтённое в Recipe.trending_score."""
+    source = models.CharField(
+        max_length=MAX_LENGTH_UNIT,
+        unique=True,
+        verbose_name='Источник',
+    )
+    last_id = models.BigIntegerField(
+        default=0,
+        verbose_name='Последний id',
+    )
+
+    class Meta:
+        verbose_name = 'Отметка рейтинга'
+        verbose_name_plural = 'Отметки рейтинга'
+
+    def __str__(self):
+        return f'{self.source}: {self.last_id}'
+
+
+class TrendingEvent(models.Model):
+    """
+    Пара пользователь — рецепт, уже учтённая в Recipe.trending_score.
+
+    Повторное добавление после удаления не учитывается второй раз.
+    """
+    source = models.CharField(
+        max_length=MAX_LENGTH_UNIT,
+        verbose_name='Источник',
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт',
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['source', 'user', 'recipe'],
+                name='unique_trending_event'
+            ),
+        ]
+        verbose_name = 'Учтённое событие рейтинга'
+        verbose_name_plural = 'Учтённые события рейтинга'
+
+    def __str__(self):
+        return f'{self.source}: {self.user_id} -> {self.recipe_id}'
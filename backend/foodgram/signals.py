@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Рецепт сохранён вместе со связанными строками (ингредиентами, тегами),
+# например формой админки. Аргумент: instance.
+recipe_related_saved = Signal()
@@ -0,0 +1,182 @@
+import random
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+
+from .loaders import batched
+from .models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, Subscription, Tag, User)
+
+SYNTHETIC_PREFIX = 'synthetic'
+SYNTHETIC_PASSWORD = 'kartofel-s-ukropom-42'
+SYNTHETIC_IMAGE = 'recipes/images/synthetic.png'
+SYLLABLES = (
+    'ба', 'ве', 'ги', 'до', 'жу', 'за', 'ки', 'ло', 'ма', 'не',
+    'по', 'ру', 'са', 'те', 'фи', 'хо', 'ца', 'чу', 'ша', 'щи',
+)
+SENTENCES = (
+    'Нарезать овощи крупными кусками.',
+    'Довести до кипения и варить на слабом огне.',
+    'Посолить, поперчить и перемешать.',
+    'Запекать в разогретой духовке до румяной корочки.',
+    'Подавать горячим со сметаной и зеленью.',
+    'Дать настояться под крышкой несколько минут.',
+)
+SYNTHETIC_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+)
+
+
+def word(number, length=3):
+    """Детерминированное «слово» из слогов по номеру."""
+    syllables = []
+    for _ in range(length):
+        number, index = divmod(number, len(SYLLABLES))
+        syllables.append(SYLLABLES[index])
+    while number:
+        number, index = divmod(number, len(SYLLABLES))
+        syllables.append(SYLLABLES[index])
+    return ''.join(syllables)
+
+
+def synthetic_users():
+    return User.objects.filter(username__startswith=SYNTHETIC_PREFIX)
+
+
+def skewed(rng, items):
+    """Случайный элемент; первые элементы выпадают заметно чаще."""
+    return items[int(len(items) * rng.random() ** 2)]
+
+
+def unique_pairs(rng, users, items, per_user, exclude_self=False):
+    """
+    Пары (пользователь, объект) без повторов, в среднем per_user.
+
+    Пользователю достаётся не больше половины объектов, иначе
+    неравномерный выбор долго добирает редкие.
+    """
+    for user in users:
+        count = min(rng.randint(0, 2 * per_user), len(items) // 2)
+        chosen = set()
+        while len(chosen) < count:
+            item = skewed(rng, items)
+            if not (exclude_self and item == user):
+                chosen.add(item)
+        for item in sorted(chosen):
+            yield user, item
+
+
+def get_image_name():
+    """Общее изображение для всех синтетических рецептов."""
+    if not default_storage.exists(SYNTHETIC_IMAGE):
+        buffer = BytesIO()
+        Image.new('RGB', (800, 600), (200, 120, 60)).save(buffer, 'PNG')
+        default_storage.save(SYNTHETIC_IMAGE, ContentFile(buffer.getvalue()))
+    return SYNTHETIC_IMAGE
+
+
+def get_catalog(model, objects):
+    if not model.objects.exists():
+        model.objects.bulk_create(objects, ignore_conflicts=True)
+    return list(model.objects.order_by('pk').values_list('pk', flat=True))
+
+
+def bulk_insert(model, objects, batch_size):
+    total = 0
+    for batch in batched(objects, batch_size):
+        model.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+@transaction.atomic
+def seed_dataset(users, recipes, ingredients_per_recipe=8, favorites=20,
+                 carts=5, subscriptions=10, ingredients=500, seed=0,
+                 batch_size=1000):
+    """
+    Заполняет базу синтетическими данными пачками bulk_create.
+
+    Один и тот же seed даёт тот же набор данных. Теги и ингредиенты
+    берутся из справочников, а если они пусты — создаются. Счётчики,
+    короткие ссылки и поисковый индекс не заполняются: для них есть
+    отдельные команды. Возвращает число созданных строк по моделям.
+    """
+    rng = random.Random(seed)
+    created = {}
+    tag_ids = get_catalog(
+        Tag, [Tag(name=name, slug=slug) for name, slug in SYNTHETIC_TAGS]
+    )
+    ingredient_ids = get_catalog(Ingredient, [
+        Ingredient(name=f'{word(number)} {word(number, 2)}', unit='г')
+        for number in range(ingredients)
+    ])
+    password = make_password(SYNTHETIC_PASSWORD)
+    created[User] = bulk_insert(User, (
+        User(
+            username=f'{SYNTHETIC_PREFIX}{number:07d}',
+            email=f'{SYNTHETIC_PREFIX}{number:07d}@example.com',
+            first_name=word(number).capitalize(),
+            last_name=word(number + users).capitalize(),
+            password=password,
+        )
+        for number in range(users)
+    ), batch_size)
+    user_ids = list(
+        synthetic_users().order_by('pk').values_list('pk', flat=True)
+    )
+    image = get_image_name()
+    created[Recipe] = bulk_insert(Recipe, (
+        Recipe(
+            author_id=skewed(rng, user_ids),
+            name=f'{word(number).capitalize()} по-домашнему',
+            text=' '.join(rng.choices(SENTENCES, k=rng.randint(2, 6))),
+            cooking_time=rng.randint(5, 180),
+            image=image,
+        )
+        for number in range(recipes)
+    ), batch_size)
+    recipe_ids = list(
+        Recipe.objects.filter(author_id__in=user_ids)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    created[Recipe.tags.through] = bulk_insert(Recipe.tags.through, (
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rng.sample(tag_ids, rng.randint(1, len(tag_ids)))
+    ), batch_size)
+    created[RecipeIngredient] = bulk_insert(RecipeIngredient, (
+        RecipeIngredient(
+            recipe_id=recipe_id,
+            ingredient_id=ingredient_id,
+            amount=rng.randint(1, 1000),
+        )
+        for recipe_id in recipe_ids
+        for ingredient_id in rng.sample(
+            ingredient_ids, min(ingredients_per_recipe, len(ingredient_ids))
+        )
+    ), batch_size)
+    created[FavoriteRecipe] = bulk_insert(FavoriteRecipe, (
+        FavoriteRecipe(user_id=user_id, recipe_id=recipe_id)
+        for user_id, recipe_id in unique_pairs(
+            rng, user_ids, recipe_ids, favorites
+        )
+    ), batch_size)
+    created[ShoppingCart] = bulk_insert(ShoppingCart, (
+        ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+        for user_id, recipe_id in unique_pairs(
+            rng, user_ids, recipe_ids, carts
+        )
+    ), batch_size)
+    created[Subscription] = bulk_insert(Subscription, (
+        Subscription(user_id=user_id, subscribed_to_id=author_id)
+        for user_id, author_id in unique_pairs(
+            rng, user_ids, user_ids, subscriptions, exclude_self=True
+        )
+    ), batch_size)
+    return created